@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
-import json, re, time, warnings, logging
+import json, re, time, warnings, logging, hashlib
 from datetime import date, datetime, timedelta
 from pathlib import Path
 from urllib.parse import urljoin, urlparse
@@ -16,17 +18,37 @@ SUBSIDY_KEYWORDS = ["補助金","助成金","支援金","給付金","交付金",
 EXCLUDE_KEYWORDS = ["奨学金","育英","後期高齢者","入札公告","競争入札"]
 HISTORY_FILE = Path("docs/data.json")
 
+# 共通 Session：ホストごとに最大2接続を keep-alive で再利用し、5xx・タイムアウトは間隔を空けて再試行
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=2, max_retries=Retry(total=3, backoff_factor=1.0, status_forcelist=(500,502,503,504), allowed_methods=frozenset(["GET"]), raise_on_status=False))
+SESSION.mount("http://", _adapter); SESSION.mount("https://", _adapter)
+HTTP_STATS = {}  # ホスト → リクエスト数（失敗を含む）・失敗数・転送量・所要時間
+
 def fetch(url, timeout=12):
+    host = urlparse(url).netloc
+    st = HTTP_STATS.setdefault(host, {"requests": 0, "failures": 0, "bytes": 0, "seconds": 0.0})
+    st["requests"] += 1  # 失敗・タイムアウトも1件と数える
+    started = time.monotonic()
+    try:
+        res = SESSION.get(url, timeout=timeout)
+    except Exception as e:
+        st["failures"] += 1; st["seconds"] += time.monotonic() - started
+        logger.debug(f"取得失敗: {url} → {e}")
+        return None
+    st["bytes"] += len(res.content); st["seconds"] += time.monotonic() - started
+    if res.status_code >= 400:
+        st["failures"] += 1
+        logger.debug(f"取得失敗: {url} → HTTP {res.status_code}")
+        return None
     try:
-        res = requests.get(url, headers=HEADERS, timeout=timeout)
-        res.raise_for_status()
         ct = res.headers.get("Content-Type","")
         if "xml" in ct or url.endswith((".xml",".rdf",".rss")):
             return BeautifulSoup(res.content, "lxml-xml")
         res.encoding = res.apparent_encoding or "utf-8"
         return BeautifulSoup(res.text, "lxml")
     except Exception as e:
-        logger.debug(f"取得失敗: {url} → {e}")
+        logger.debug(f"解析失敗: {url} → {e}")
         return None
 
 def is_subsidy(text):
@@ -104,7 +126,7 @@ def collect_html(name, pref, base_url, pattern=None):
     return results
 
 def make_row(title, org, pref, url, detail):
-    return {"id": re.sub(r"\W","",title[:20])+str(abs(hash(url))%10000), "title":title[:120], "org":org, "pref":pref, "amount":detail.get("amount",""), "deadline":detail.get("deadline",""), "target":detail.get("target",""), "category":classify(title), "url":url, "source":"自治体" if pref not in ("全国",) else "国・省庁", "date":str(date.today())}
+    return {"id": re.sub(r"\W","",title[:20])+str(int(hashlib.md5(url.encode()).hexdigest(),16)%10000), "title":title[:120], "org":org, "pref":pref, "amount":detail.get("amount",""), "deadline":detail.get("deadline",""), "target":detail.get("target",""), "category":classify(title), "url":url, "source":"自治体" if pref not in ("全国",) else "国・省庁", "date":str(date.today())}
 
 RSS_SOURCES = [("経済産業省","全国","https://www.meti.go.jp/feed/topics.rdf"),("厚生労働省","全国","https://www.mhlw.go.jp/rss/topics.rdf"),("中小企業庁","全国","https://www.chusho.meti.go.jp/rss/news.rdf"),("総務省","全国","https://www.soumu.go.jp/menu_kyotsuu/whatsnew/rss.xml"),("神奈川県","神奈川県","https://www.pref.kanagawa.jp/prs/list.xml"),("大阪府","大阪府","https://www.pref.osaka.lg.jp/rss/hodo/index.rdf"),("愛知県","愛知県","https://www.pref.aichi.jp/rss/news/index.rdf"),("福岡県","福岡県","https://www.pref.fukuoka.lg.jp/rss/news.rdf"),("埼玉県","埼玉県","https://www.pref.saitama.lg.jp/rss/atom/newsrelease.xml"),("千葉県","千葉県","https://www.pref.chiba.lg.jp/rss/news.xml"),("兵庫県","兵庫県","https://web.pref.hyogo.lg.jp/rss/news.rdf"),("広島県","広島県","https://www.pref.hiroshima.lg.jp/rss/news.rdf"),("北海道","北海道","https://www.pref.hokkaido.lg.jp/rss/news.rdf"),("静岡県","静岡県","https://www.pref.shizuoka.jp/rss/atom/top.xml"),("京都府","京都府","https://www.pref.kyoto.jp/rss/index.rdf"),("宮城県","宮城県","https://www.pref.miyagi.jp/rss/news.rdf")]
 HTML_SOURCES = [("東京都産業労働局","東京都","https://www.sangyo-rodo.metro.tokyo.lg.jp/news/",r"/news/"),("東京中小企業振興公社","東京都","https://www.tokyo-kosha.or.jp/support/josei/index.html",r"/support/josei/"),("ミラサポplus","全国","https://mirasapo-plus.go.jp/subsidy/",r"/subsidy/\d+"),("J-Net21","全国","https://j-net21.smrj.go.jp/snavi/articles?category=C0302",r"/snavi/articles/\d+"),("補助金ポータル","全国","https://hojyokin-portal.jp/columns/sme_subsidy",None)]
@@ -154,6 +176,8 @@ def main():
     with open("docs/last_updated.txt","w") as f:
         f.write(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
     logger.info(f"保存完了: {len(combined)}件")
+    for host, st in sorted(HTTP_STATS.items()):
+        logger.info(f"  {host}: {st['requests']}件 {st['bytes']/1024:.0f}KB 平均{st['seconds']/max(st['requests'],1):.2f}秒 失敗{st['failures']}件")
 
 if __name__ == "__main__":
     main()
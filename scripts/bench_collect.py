@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""収集処理全体のオフラインベンチマーク
+
+collect.py --record で記録したレスポンスを --replay で再生し、一時ディレクトリで main() を通して実行する。
+1回目は HTTP キャッシュが空の状態、2回目以降は前回のキャッシュ・ストアを引き継いだ状態になる。
+段階（scrape / enrich / store / publish）ごとに所要時間・リクエスト数・転送量・HTML 解析時間を、
+--memory を付けると tracemalloc で測ったメモリのピークも表示する（計測のぶん遅くなる）。
+
+    python scripts/collect.py --record fixtures/      # 実サイトから一度だけ記録
+    python scripts/bench_collect.py fixtures/ [--runs N] [--history docs/data.json] [--memory]
+"""
+import argparse, hashlib, importlib, logging, os, shutil, sys, tempfile, time, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import collect  # noqa: E402
+
+def run_once(fixtures, workdir, memory):
+    """workdir で collect.main(--replay) を1回実行し、(所要時間, 段階ごとの記録, data.json のハッシュ) を返す"""
+    module = importlib.reload(collect)  # 通信統計・接続プールなどのモジュール状態を毎回作り直す
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        module.main(["--replay", str(fixtures), "--compact"])
+    finally:
+        elapsed = time.perf_counter() - started
+        if memory:
+            tracemalloc.stop()
+        os.chdir(cwd)
+    data = Path(workdir) / module.HISTORY_FILE
+    digest = hashlib.sha1(data.read_bytes()).hexdigest()[:12] if data.exists() else "-"
+    return elapsed, module.STAGE_STATS, digest
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fixtures", help="collect.py --record で記録したディレクトリ")
+    parser.add_argument("--runs", type=int, default=2, help="同じ作業ディレクトリで続けて実行する回数")
+    parser.add_argument("--history", default=str(collect.HISTORY_FILE),
+                        help="最初の data.json（ストアはここから作られる）")
+    parser.add_argument("--memory", action="store_true", help="段階ごとのメモリのピークも測る")
+    parser.add_argument("--verbose", action="store_true", help="collect.py のログも表示する")
+    args = parser.parse_args()
+    fixtures = Path(args.fixtures).resolve()
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        (Path(workdir) / "docs").mkdir()
+        if Path(args.history).exists():
+            shutil.copy(args.history, Path(workdir) / "docs" / "data.json")
+        for run in range(1, args.runs + 1):
+            elapsed, stages, digest = run_once(fixtures, workdir, args.memory)
+            label = "キャッシュなし" if run == 1 else "キャッシュあり"
+            print(f"#{run}（{label}）: 全体 {elapsed:.2f}秒 / data.json {digest}")
+            for st in stages:
+                peak = f" / メモリ最大 {st['peak_kb'] / 1024:.1f}MB" if st["peak_kb"] is not None else ""
+                print(f"  {st['stage']:<8} {st['seconds']:7.2f}秒 / {st['requests']:4d}件 "
+                      f"{st['bytes'] / 1024:7.0f}KB / 解析 {st['parse_seconds']:.2f}秒{peak}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""日付抽出のマイクロベンチマーク
+
+旧実装（キーワードごとに正規表現を走査）と scan_dates による一回走査を、
+実ページのコーパスで比較する。コーパスは HTTP キャッシュ（.cache/http/*.body）か、
+引数で指定したディレクトリの *.html / *.body を使う。
+
+    python scripts/bench_dates.py [コーパスのディレクトリ] [--repeat N]
+"""
+import argparse, gzip, re, sys, time
+from datetime import date
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import collect  # noqa: E402
+
+# ---- 旧実装（比較用にそのまま残す） ----
+
+def legacy_parse_japanese_date(text):
+    if not text:
+        return None
+    for pattern, era in [
+        (r'令和\s*(\d+)\s*年\s*(\d+)\s*月\s*(\d+)\s*日', True),
+        (r'(\d{4})\s*年\s*(\d+)\s*月\s*(\d+)\s*日', False),
+        (r'(\d{4})-(\d{2})-(\d{2})', False),
+        (r'(\d{4})/(\d{2})/(\d{2})', False),
+    ]:
+        m = re.search(pattern, text)
+        if m:
+            try:
+                year = int(m.group(1)) + (2018 if era else 0)
+                month, day = int(m.group(2)), int(m.group(3))
+                if 2019 <= year <= 2035 and 1 <= month <= 12 and 1 <= day <= 31:
+                    return date(year, month, day)
+            except:
+                pass
+    return None
+
+def legacy_extract_deadline(text):
+    if not text:
+        return ""
+    deadline_patterns = [
+        r'(?:締[切め]|期限|受付終了|申請期間|公募期間|募集期間|応募期限|提出期限).*?'
+        r'令和\s*(\d+)\s*年\s*(\d+)\s*月\s*(\d+)\s*日',
+        r'(?:締[切め]|期限|受付終了|申請期間|公募期間|募集期間|応募期限|提出期限).*?'
+        r'(\d{4})\s*年\s*(\d+)\s*月\s*(\d+)\s*日',
+        r'令和\s*(\d+)\s*年\s*(\d+)\s*月\s*(\d+)\s*日',
+        r'(\d{4})\s*年\s*(\d+)\s*月\s*(\d+)\s*日',
+        r'(\d{4})-(\d{2})-(\d{2})',
+    ]
+    for pattern in deadline_patterns:
+        for m in re.findall(pattern, text):
+            try:
+                year = 2018 + int(m[0]) if len(m[0]) <= 2 else int(m[0])
+                month, day = int(m[1]), int(m[2])
+                if 2020 <= year <= 2035 and 1 <= month <= 12 and 1 <= day <= 31:
+                    return f"令和{year-2018}年{month}月{day}日締切"
+            except:
+                continue
+    return ""
+
+def legacy_extract_start_date(text):
+    if not text:
+        return None
+    for kw in collect.START_DATE_KEYWORDS:
+        m = re.search(re.escape(kw) + r'.{0,30}', text)
+        if m:
+            d = legacy_parse_japanese_date(m.group(0) + text[m.end():m.end()+30])
+            if d:
+                return d
+    return None
+
+def legacy_earliest_date(text):
+    all_dates = []
+    for pattern, era in [(r'令和\s*(\d+)\s*年\s*(\d+)\s*月\s*(\d+)\s*日', True),
+                         (r'(\d{4})\s*年\s*(\d+)\s*月\s*(\d+)\s*日', False)]:
+        for m in re.finditer(pattern, text):
+            try:
+                d = date(int(m.group(1)) + (2018 if era else 0), int(m.group(2)), int(m.group(3)))
+                if 2019 <= d.year <= 2035:
+                    all_dates.append(d)
+            except:
+                pass
+    return min(all_dates) if all_dates else None
+
+# ---- 1ページ分の処理（fetch_page_info の本文テキスト部分・一覧の親要素に相当） ----
+
+def legacy_page(text):
+    start = legacy_extract_start_date(text) or legacy_earliest_date(text)
+    return legacy_extract_deadline(text), start
+
+def scan_page(text):
+    scan = collect.scan_dates(text)
+    start = collect.start_date_from_scan(scan) or collect.earliest_date_from_scan(scan)
+    return collect.deadline_from_scan(scan), start
+
+def legacy_snippet(text):
+    return legacy_extract_deadline(text), legacy_extract_start_date(text)
+
+def scan_snippet(text):
+    scan = collect.scan_dates(text)
+    return collect.deadline_from_scan(scan), collect.start_date_from_scan(scan)
+
+def load_corpus(directory):
+    """ページ本文（main 要素のテキスト）と、一覧の親要素テキストを集める"""
+    pages, snippets = [], []
+    paths = sorted(list(directory.glob("*.body")) + list(directory.glob("*.html")))
+    for path in paths:
+        raw = path.read_bytes()
+        if path.suffix == ".body":
+            raw = gzip.decompress(raw)
+        soup = BeautifulSoup(raw, "lxml")
+        main = soup.find("main") or soup.find(id="content") or soup.find(class_="content") or soup
+        pages.append(main.get_text(" ", strip=True))
+        for a in soup.find_all("a", href=True):
+            if a.parent:
+                snippets.append(a.parent.get_text(" ", strip=True))
+    return pages, snippets
+
+def synthetic_corpus(n=200):
+    """実ページがないときの代用。自治体ページに多い構成（メニュー・本文・問い合わせ先）を模した本文"""
+    menu = " ".join(["くらし・手続き", "健康・福祉", "子育て・教育", "産業・しごと", "まちづくり・環境",
+                     "防災・安全", "県政情報", "観光・文化", "よくある質問", "サイトマップ"]) * 8
+    footer = "お問い合わせ 産業労働部 産業振興課 電話 03-1234-5678 ファックス 03-1234-5679 " * 4
+    pages = []
+    for i in range(n):
+        body = [menu, "本事業は中小企業の設備投資を支援するものです。対象経費は機械装置費等です。" * 20]
+        if i % 3:
+            body.append(f"掲載日：令和7年{1 + i % 12}月{1 + i % 28}日")
+        if i % 2:
+            body.append(f"申請期間：令和8年{1 + i % 12}月1日から令和8年{1 + (i + 1) % 12}月{1 + i % 28}日まで")
+        body.append(footer)
+        if i % 5 == 0:
+            body.append(f"更新日 {2025 + i % 2}-{1 + i % 12:02d}-{1 + i % 28:02d}")
+        pages.append(" ".join(body))
+    snippets = []
+    for i in range(n * 5):
+        snippet = "中小企業デジタル化支援補助金のご案内"
+        if i % 4 == 0:
+            snippet += f" 令和7年{1 + i % 12}月{1 + i % 28}日掲載"
+        snippets.append(snippet)
+    return pages, snippets
+
+def bench(func, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", default=".cache/http")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus_dir = Path(args.corpus)
+    pages, snippets = load_corpus(corpus_dir) if corpus_dir.is_dir() else ([], [])
+    source = str(corpus_dir)
+    if not pages:
+        pages, snippets = synthetic_corpus()
+        source = "合成データ"
+    print(f"コーパス: {source}（本文{len(pages)}件 / 一覧の親要素{len(snippets)}件）")
+
+    cases = [
+        ("個別ページ本文", pages, legacy_page, scan_page),
+        ("一覧の親要素", snippets, legacy_snippet, scan_snippet),
+    ]
+    for name, texts, old, new in cases:
+        mismatches = sum(1 for t in texts if old(t) != new(t))
+        t_old = bench(old, texts, args.repeat)
+        t_new = bench(new, texts, args.repeat)
+        speedup = t_old / t_new if t_new else float("inf")
+        print(f"{name}: 旧 {t_old * 1000:.1f}ms / 新 {t_new * 1000:.1f}ms "
+              f"→ {speedup:.1f}倍（結果の不一致 {mismatches}件）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""統合処理のベンチマーク
+
+旧実装（既存アイテムを毎回先頭から探し、新規は insert(0, ...)）と、collect.py が実際に使うストアへの統合
+（store_items。既存の id を引いて MERGE_RULES で更新し、新規に seq を振って書き込む）を、合成した履歴で比較する。
+ストアはメモリ上の SQLite に import_history と同じ並びで作り、作る時間は測らない。
+旧実装は二乗オーダーのため --legacy-max 件を超える履歴では測らない。
+
+    python scripts/bench_merge.py [--sizes 10000,50000,...] [--new-ratio R] [--legacy-max N]
+"""
+import argparse, copy, json, random, sqlite3, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import collect  # noqa: E402
+
+# ---- 旧実装（比較用にそのまま残す） ----
+
+def legacy_merge(existing, all_new_items):
+    existing_ids = {item["id"] for item in existing}
+    for item in all_new_items:
+        if item["id"] not in existing_ids:
+            existing.insert(0, item)
+            existing_ids.add(item["id"])
+        else:
+            for ex in existing:
+                if ex["id"] == item["id"]:
+                    if item.get("deadline") and not ex.get("deadline"):
+                        ex["deadline"] = item["deadline"]
+                    if item.get("start_date") and not ex.get("start_date"):
+                        ex["start_date"] = item["start_date"]
+                    if item.get("expired_by_age"):
+                        ex["expired_by_age"] = True
+                    break
+    return existing
+
+def make_item(n, rng):
+    item = {
+        "id": collect.make_id(f"https://example.lg.jp/docs/{n}.html"),
+        "title": f"令和7年度 中小企業支援補助金 第{n}号",
+        "org": "県産業労働部",
+        "pref": rng.choice(collect.ALL_PREFS),
+        "amount": "",
+        "deadline": "",
+        "target": "",
+        "category": "補助金・助成金（一般）",
+        "url": f"https://example.lg.jp/docs/{n}.html",
+        "source": "自治体",
+        "date": "2026-01-01",
+    }
+    if rng.random() < 0.4:
+        item["deadline"] = f"令和8年{rng.randint(1, 12)}月{rng.randint(1, 28)}日締切"
+    if rng.random() < 0.3:
+        item["start_date"] = f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    return item
+
+def synthetic_history(size, new_ratio, seed=0):
+    """size 件の既存履歴と、その new_ratio 倍の今回取得分（半分は既存と同じ id）を作る"""
+    rng = random.Random(seed)
+    existing = [make_item(n, rng) for n in range(size)]
+    count = max(1, int(size * new_ratio))
+    new_items = []
+    for k in range(count):
+        if k % 2:
+            item = make_item(rng.randrange(size), rng)
+            item["expired_by_age"] = rng.random() < 0.1
+        else:
+            item = make_item(size + k, rng)
+        new_items.append(item)
+    # 今回取得分は重複排除済み
+    unique = {}
+    for item in new_items:
+        unique.setdefault(item["id"], item)
+    return existing, list(unique.values())
+
+def new_store(existing):
+    """existing（新しい順）を import_history と同じ seq（先頭ほど大きい）で入れたメモリ上のストア"""
+    db = sqlite3.connect(":memory:")
+    db.executescript(collect.DB_SCHEMA)
+    db.executescript(collect.DB_ADDED_INDEXES)
+    collect.write_items(db, [collect.item_row(item, -n, item["date"], item["date"]) for n, item in enumerate(existing)])
+    return db
+
+def merged_fields(items):
+    """比較に使う、統合で変わりうるフィールドだけの並び"""
+    return [(item["id"], item.get("deadline") or "", item.get("start_date") or "", bool(item.get("expired_by_age")))
+            for item in items]
+
+def time_legacy(existing, new_items):
+    existing, new_items = copy.deepcopy(existing), copy.deepcopy(new_items)
+    started = time.perf_counter()
+    result = legacy_merge(existing, new_items)
+    return time.perf_counter() - started, merged_fields(result)
+
+def time_store(existing, new_items):
+    db = new_store(copy.deepcopy(existing))
+    new_items = copy.deepcopy(new_items)
+    started = time.perf_counter()
+    collect.store_items(db, new_items)
+    elapsed = time.perf_counter() - started
+    result = [json.loads(data) for (data,) in db.execute("SELECT data FROM items ORDER BY seq DESC")]
+    db.close()
+    return elapsed, merged_fields(result)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,50000,100000,500000")
+    parser.add_argument("--new-ratio", type=float, default=0.1)
+    parser.add_argument("--legacy-max", type=int, default=50000)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        existing, new_items = synthetic_history(size, args.new_ratio)
+        t_new, merged = time_store(existing, new_items)
+        line = f"履歴{size}件 / 今回{len(new_items)}件: ストア {t_new * 1000:.1f}ms"
+        if size <= args.legacy_max:
+            t_old, legacy = time_legacy(existing, new_items)
+            speedup = t_old / t_new if t_new else float("inf")
+            line += (f" / 旧 {t_old * 1000:.1f}ms → {speedup:.1f}倍"
+                     f"（結果{'一致' if merged == legacy else '不一致'}）")
+        else:
+            line += " / 旧 省略"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""公開データの形式ごとのサイズ・読み込み時間の比較
+
+現行の data.json（indent=2）・最小化しただけの JSON・--compact の列指向形式について、
+そのまま / gzip / brotli（入っていれば）のサイズと、json.loads（列指向は items への展開込み）の時間を測る。
+件数を --scale 倍に水増しして大きな履歴も試せる。
+
+    python scripts/bench_output.py [data.json] [--scale N] [--repeat N]
+"""
+import argparse, gzip, json, sys, tempfile, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import collect  # noqa: E402
+
+def scaled(output, scale):
+    """アイテムを scale 倍に複製（id・URL は重ならないよう番号を付ける）"""
+    items = []
+    for n in range(scale):
+        for item in output["items"]:
+            copy = dict(item)
+            if n:
+                copy["id"] = f"{item['id']}-{n}"
+                copy["url"] = f"{item['url']}#{n}"
+            items.append(copy)
+    return dict(output, total=len(items), items=items)
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def load_expanded(path):
+    with open(path, encoding="utf-8") as f:
+        return collect.expand_compact(json.load(f))
+
+def load_plain(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=str(collect.HISTORY_FILE))
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        output = scaled(json.load(f), args.scale)
+    items = output.pop("items")
+    print(f"{args.path}: {len(items)}件")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pretty, minified, compact = Path(tmp) / "data.json", Path(tmp) / "data.min-plain.json", Path(tmp) / "data.min.json"
+        stats = collect.new_stats()
+        collect.write_history(pretty, output, collect.tally(iter(items), stats))
+        with open(minified, "w", encoding="utf-8") as f:
+            json.dump(dict(output, items=items), f, ensure_ascii=False, separators=(",", ":"))
+        collect.write_compact(output, iter(items), stats["fields"], compact)
+        formats = [
+            ("現行（indent=2）", pretty, load_plain),
+            ("最小化", minified, load_plain),
+            ("列指向（--compact）", compact, load_expanded),
+        ]
+        for name, path, load in formats:
+            body = path.read_bytes()
+            sizes = [f"{len(body) / 1024:.0f}KB", f"gzip {len(gzip.compress(body, 9)) / 1024:.0f}KB"]
+            if collect.brotli is not None:
+                sizes.append(f"brotli {len(collect.brotli.compress(body, quality=11)) / 1024:.0f}KB")
+            t = best_of(lambda: load(path), args.repeat)
+            print(f"{name}: {' / '.join(sizes)} / 読み込み（展開込み） {t * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
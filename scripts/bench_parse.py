@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""HTML 解析のベンチマーク
+
+parse_listing / parse_page_info を、BeautifulSoup 版（PARSER_BACKEND = "bs4"）と lxml 版で比較する。
+コーパスは collect.py --record の記録先か HTTP キャッシュ（どちらも *.body は gzip）、
+または *.html を置いたディレクトリ。どちらにも無ければ合成したページを使う。
+--workers を付けると、取得スレッドから並列に解析したときの所要時間を、スレッド内の解析と
+N プロセスの解析用プールで比べる（--parse-workers 相当）。
+
+    python scripts/bench_parse.py [コーパスのディレクトリ] [--repeat N] [--workers N]
+"""
+import argparse, gzip, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import collect  # noqa: E402
+
+PAGE_URL = "https://www.pref.example.lg.jp/docs/index.html"
+
+def load_corpus(directory):
+    pages = []
+    for path in sorted(list(directory.glob("*.body")) + list(directory.glob("*.html"))):
+        raw = path.read_bytes()
+        if path.suffix == ".body":
+            raw = gzip.decompress(raw)
+        pages.append(raw.decode("utf-8", errors="replace"))
+    return pages
+
+def synthetic_corpus(n=100):
+    """自治体サイトに多い構成（ヘッダー・メニュー・一覧・問い合わせ先・スクリプト）を模したページ"""
+    menu = "".join(f'<li><a href="/menu/{i}.html">くらし・手続き メニュー{i}</a></li>' for i in range(60))
+    footer = "<footer><p>お問い合わせ 産業労働部 産業振興課 電話 03-1234-5678</p></footer>"
+    script = "<script>var cfg = {menu: '申請期間', deadline: '締切'};</script>" * 3
+    pages = []
+    for i in range(n):
+        rows = "".join(
+            f'<li><span>令和7年{1 + k % 12}月{1 + k % 28}日</span>'
+            f'<a href="/docs/{i}-{k}.html">令和7年度 中小企業設備投資補助金 第{k}回の募集について</a>'
+            f'{"<span>申請期間：令和8年1月5日から令和8年2月" + str(1 + k % 28) + "日まで</span>" if k % 3 == 0 else ""}</li>'
+            for k in range(40))
+        body = (f"<main><h1>補助金・助成金一覧</h1><p>受付期間 令和8年{1 + i % 12}月1日から令和8年{1 + (i + 1) % 12}月"
+                f"{1 + i % 28}日まで</p><ul>{rows}</ul><a href='?page=2'>次へ</a></main>")
+        pages.append(f"<html><head><title>補助金</title>{script}</head><body><header><ul>{menu}</ul></header>"
+                     f"{body}{footer}</body></html>")
+    return pages
+
+def parse_all(pages):
+    return [(collect.parse_listing(html, PAGE_URL, "東京都", "東京都", title_filter=False),
+             collect.parse_page_info(html)) for html in pages]
+
+def parse_one(content):
+    """取得スレッドの fetch_listing / fetch_page_info と同じく、本文のバイト列を run_parse に渡す"""
+    return (collect.run_parse(collect.parse_listing_body, content, "utf-8", PAGE_URL, "東京都", "東京都", None, False),
+            collect.run_parse(collect.parse_page_info_body, content, "utf-8"))
+
+def bench_threads(bodies, workers, repeat):
+    """MAX_WORKERS 本の取得スレッドから解析したときの所要時間（workers が 0 ならスレッド内で解析）"""
+    collect.start_parse_pool(workers)
+    try:
+        collect.run_parallel(parse_one, [(b,) for b in bodies[:workers]])  # ワーカーの起動を計測から外す
+        best, result = float("inf"), None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = collect.run_parallel(parse_one, [(b,) for b in bodies])
+            best = min(best, time.perf_counter() - started)
+    finally:
+        collect.stop_parse_pool()
+    return best, result
+
+def bench(backend, pages, repeat):
+    collect.PARSER_BACKEND = backend
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = parse_all(pages)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", default=".cache/http")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=0, help="解析用プロセスプールの大きさ")
+    args = parser.parse_args()
+
+    corpus_dir = Path(args.corpus)
+    pages = load_corpus(corpus_dir) if corpus_dir.is_dir() else []
+    source = str(corpus_dir)
+    if not pages:
+        pages = synthetic_corpus()
+        source = "合成データ"
+    size = sum(len(html) for html in pages)
+    print(f"コーパス: {source}（{len(pages)}ページ / {size / 1024:.0f}K文字）")
+
+    t_old, old = bench("bs4", pages, args.repeat)
+    t_new, new = bench("lxml", pages, args.repeat)
+    mismatches = sum(1 for a, b in zip(old, new) if a != b)
+    speedup = t_old / t_new if t_new else float("inf")
+    print(f"一覧＋個別ページの解析: bs4 {t_old * 1000:.1f}ms / lxml {t_new * 1000:.1f}ms "
+          f"→ {speedup:.1f}倍（結果の不一致 {mismatches}ページ）")
+
+    if args.workers:
+        bodies = [html.encode("utf-8") for html in pages]
+        t_inline, inline = bench_threads(bodies, 0, args.repeat)
+        t_pool, pooled = bench_threads(bodies, args.workers, args.repeat)
+        mismatches = sum(1 for a, b in zip(inline, pooled) if a != b)
+        speedup = t_inline / t_pool if t_pool else float("inf")
+        print(f"{collect.MAX_WORKERS}スレッドから解析: スレッド内 {t_inline * 1000:.1f}ms / "
+              f"{args.workers}プロセス {t_pool * 1000:.1f}ms → {speedup:.1f}倍（結果の不一致 {mismatches}ページ）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""検索索引のベンチマーク
+
+合成したアイテム（自治体名・対象・事業名の組み合わせ）で collect.py の検索索引（search.*.json）を作り、
+大きさ（素の JSON と gzip）と作成時間、ダッシュボードと同じ手順（語ごとの 2-gram の投稿リストの共通部分を
+取り、候補だけ文字列を確かめる）での検索時間を、旧実装（全件の文字列を小文字にして部分一致）と比べる。
+よく出る 2-gram だけの語は索引で絞り込めないので、全件走査と同じ程度の時間になる。
+
+    python scripts/bench_search.py [--sizes 10000,100000] [--repeat N]
+"""
+import argparse, gzip, json, random, statistics, sys, time, unicodedata
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import collect  # noqa: E402
+
+SUBJECTS = ["中小企業", "小規模事業者", "医療機関", "介護施設", "商店街", "農業者", "観光事業者", "保育所",
+            "NPO法人", "スタートアップ", "製造業", "運送事業者", "飲食店", "宿泊施設", "建設業", "漁業者",
+            "林業事業体", "障害福祉サービス事業所", "薬局", "歯科診療所", "私立学校", "文化団体", "町会・自治会",
+            "商工会", "タクシー事業者", "バス事業者", "理容・美容業", "クリーニング業", "公衆浴場", "酪農家"]
+PURPOSES = ["設備投資", "デジタル化", "省エネルギー設備導入", "販路開拓", "人材育成", "事業承継", "創業",
+            "BCP策定", "物価高騰対策", "賃上げ", "テレワーク導入", "知的財産活用", "DX推進", "脱炭素化",
+            "海外展開", "新商品開発", "空き店舗活用", "耐震改修", "感染症対策", "太陽光発電導入", "EV導入",
+            "キャッシュレス決済導入", "インバウンド対応", "働き方改革", "女性活躍推進", "障害者雇用",
+            "外国人材受入れ", "事業再構築", "経営改善", "防犯カメラ設置", "水害対策", "燃料費高騰対策",
+            "スマート農業", "六次産業化", "地産地消", "ブランド化", "人手不足対策", "生産性向上", "研究開発",
+            "産学連携"]
+KINDS = ["補助金", "助成金", "支援金", "奨励金", "給付金", "融資制度", "利子補給", "交付金"]
+SUFFIXES = ["の募集について", "のご案内", "（第{n}回）の公募", "の申請受付を開始します", "【{n}次募集】", ""]
+DIVISIONS = ["産業労働部 産業振興課", "健康福祉部 医療政策課", "農林水産部 農業振興課", "環境部 脱炭素推進課",
+             "商工観光部 観光課", "中小企業振興公社"]
+PLACE_CHARS = "青赤白黒北南東西中上下大小山川田野原島崎橋本松竹梅桜森林沢岡谷浜津江高富福豊長久日月水金土木安平和"
+TARGETS = ["県内に事業所を有する中小企業者", "個人事業主を含む", "医療法人・社会福祉法人", "創業5年未満の事業者",
+           "商店街振興組合", ""]
+QUERIES = ["補助金", "事業", "金",  # ほとんどのアイテムに出る語（索引では絞り込めない）
+           "医療", "ＤＸ", "省エネ", "薬局 キャッシュレス", "六次産業化", "第3回", "タクシー", "耐震", "存在しない語句"]
+
+def synthetic_items(n, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for seq in range(n):
+        pref = rng.choice(collect.ALL_PREFS)
+        place = "".join(rng.choice(PLACE_CHARS) for _ in range(2)) + rng.choice("市町村")
+        title = (f"令和{rng.randint(6, 8)}年度 {place}{rng.choice(SUBJECTS)}{rng.choice(PURPOSES)}{rng.choice(KINDS)}"
+                 + rng.choice(SUFFIXES).format(n=rng.randint(1, 5)))
+        items.append({"seq": seq, "title": title, "org": f"{pref}{place}{rng.choice(DIVISIONS)}",
+                      "target": rng.choice(TARGETS), "pref": pref})
+    return items
+
+def build(items):
+    postings = {}
+    for item in items:
+        collect.add_to_search_index(postings, item)
+    return collect.encode_search_index(postings, len(items))
+
+def decode(index):
+    """ダッシュボードの postings() と同じく、差分の列を seq の昇順に戻す。(投稿リスト, common, 1文字の語の上限) を返す"""
+    doc = json.loads(index)
+    decoded = {}
+    for gram, deltas in doc["postings"].items():
+        seqs, seq = [], 0
+        for d in deltas:
+            seq += d
+            seqs.append(seq)
+        decoded[gram] = seqs
+    return decoded, set(doc["common"]), doc["docs"] * doc["common_ratio"]
+
+def normalize(text):
+    return unicodedata.normalize("NFKC", text).lower()
+
+def search_index(postings, common, limit, texts, query):
+    """ダッシュボードの searchCandidates と matchItem の検索部分"""
+    words = normalize(query).split()
+    lists = []
+    for word in words:
+        if len(word) == 1:
+            found = [g for g in postings if word in g]
+            if any(word in g for g in common) or sum(len(postings[g]) for g in found) > limit:
+                continue
+            lists.append(sorted({s for g in found for s in postings[g]}))
+        else:
+            lists.extend(postings.get(word[i:i + 2], []) for i in range(len(word) - 1)
+                         if word[i:i + 2] not in common)
+    if lists:
+        lists.sort(key=len)
+        hits = set(lists[0])
+        for seqs in lists[1:]:
+            if not hits:
+                break
+            hits.intersection_update(seqs)
+        hits = sorted(hits)
+    else:
+        hits = range(len(texts))
+    for word in words:
+        hits = [seq for seq in hits if word in texts[seq]]
+    return hits
+
+def search_scan(texts, query):
+    """旧実装（全件の文字列に部分一致）"""
+    q = query.lower()
+    return [seq for seq, text in enumerate(texts) if q in text]
+
+def timed(func, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        items = synthetic_items(size)
+        data = json.dumps({"items": items}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        t_build, index = timed(build, items, repeat=1)
+        raw = index.encode("utf-8")
+        postings, common, limit = decode(index)
+        print(f"{size}件: 索引 {len(raw) / 1024:.0f}KB（gzip {len(gzip.compress(raw)) / 1024:.0f}KB・"
+              f"2-gram {len(postings)}種＋よく出るもの{len(common)}種）"
+              f" / アイテム {len(data) / 1024:.0f}KB（gzip {len(gzip.compress(data)) / 1024:.0f}KB）"
+              f" / 作成 {t_build * 1000:.0f}ms")
+
+        texts = [normalize("\n".join(filter(None, (i["title"], i["org"], i["target"])))) for i in items]
+        old_texts = ["\n".join(filter(None, (i["title"], i["org"], i["target"]))).lower() for i in items]
+        old_times, new_times = [], []
+        for query in QUERIES:
+            t_new, found = timed(search_index, postings, common, limit, texts, query, repeat=args.repeat)
+            t_old, old = timed(search_scan, old_texts, query, repeat=args.repeat)
+            new_times.append(t_new)
+            old_times.append(t_old)
+            print(f"  「{query}」: {len(found)}件（旧 {len(old)}件） 索引 {t_new * 1000:.2f}ms / "
+                  f"全件走査 {t_old * 1000:.2f}ms")
+        print(f"  中央値: 索引 {statistics.median(new_times) * 1000:.2f}ms / "
+              f"全件走査 {statistics.median(old_times) * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,44 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
-import json, time, logging, re, hashlib
+from lxml import etree
+import argparse, json, os, sys, time, logging, re, hashlib, threading, gzip, sqlite3, tempfile, tracemalloc
+import cProfile, io, multiprocessing, pstats, unicodedata
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import date, datetime, timedelta
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit
+
+try:
+    import brotli
+except ImportError:  # 無ければ .br は書かない
+    brotli = None
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 HISTORY_FILE = Path("docs/data.json")
+SHARD_DIR = Path("docs/data")  # ダッシュボード用の manifest.json と都道府県別シャード
+DELTA_DIR = Path("docs/deltas")  # 実行ごとの差分と、その一覧 index.json
+DELTA_KEEP = 30  # index.json に残す差分の数（古いファイルは削除）
+PARTIAL_DIR = Path("partials")  # --shard の部分結果を書き、--reduce で読むディレクトリ
+RUN_REPORT_FILE = Path("docs/run_report.json")  # 実行ごとの段階別・取得元別の計測
+RUN_REPORT_KEEP = 30  # run_report.json の history に残す実行の数
+PROFILE_TOP = 30  # --profile のときログに出す関数の数（累積時間順）
+SEARCH_FIELDS = ("title", "org", "target")  # ダッシュボードの検索索引（シャードと並べて置く）に入れるフィールド
+SEARCH_COMMON_RATIO = 0.05  # これより多い割合のアイテムに出る 2-gram は投稿リストを持たない（絞り込みに効かず大きいだけ）
+COMPACT_FILE = Path("docs/data.min.json")  # --compact のときだけ書く（.gz / .br も並べて置く）
+COMPACT_INTERNED = ("org", "pref", "category", "source", "status")  # 文字列表の番号で持つフィールド
+DB_FILE = Path("state/collect.sqlite3")
+ENRICH_STATE_FILE = Path("state/enrichment.json")  # 旧形式。ストアに取り込んだら削除する
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
@@ -37,6 +65,31 @@ SUBSIDY_KEYWORDS = [
     "物価高騰","支援について","給付","奨励金","交付金","補填",
     "医療機関","介護","薬局","病院","診療所",
 ]
+# フィード（FEED_TARGETS）のエントリの判定。報道発表などもすべて流れてくるので、一覧ページ向けの SUBSIDY_KEYWORDS
+# （雇用・病院・公募など）ではなく補助金そのものを指す語で拾い、FEED_EXCLUDE_KEYWORDS を含むものは落とす
+FEED_KEYWORDS = [
+    "補助金","助成金","支援金","給付金","交付金","奨励金","補助事業","助成事業","支援事業","支援制度","物価","光熱費",
+    "エネルギー高騰","賃上げ","雇用調整","IT導入","DX補助","創業支援","設備投資支援","省エネ補助","販路開拓支援","輸出支援",
+]
+FEED_EXCLUDE_KEYWORDS = ["奨学金","育英","後期高齢者","入札公告","競争入札"]
+
+DEFAULT_CATEGORY = "補助金・助成金（一般）"
+CATEGORY_KEYWORDS = {
+    "IT・デジタル":     ["IT","DX","デジタル","AI","クラウド","ICT","システム","電子"],
+    "雇用・人材":       ["雇用","人材","採用","訓練","賃上げ","賃金","労働","働き方"],
+    "設備・機械":       ["設備","機械","装置","工場","製造","ものづくり"],
+    "創業・起業":       ["創業","起業","スタートアップ","開業"],
+    "販路拡大":         ["販路","輸出","海外","EC","展示会"],
+    "省エネ・環境":     ["省エネ","環境","脱炭素","再生可能","GX","太陽光"],
+    "研究開発":         ["研究","開発","技術","イノベーション"],
+    "融資・貸付":       ["融資","貸付","ローン","資金"],
+    "事業再構築":       ["再構築","転換","新事業","多角化"],
+    "物価・光熱費対策": ["物価","光熱費","エネルギー","電気代","燃料","高騰","物価高騰"],
+    "医療・福祉":       ["医療","診療","病院","薬局","介護","福祉","医療機関"],
+    "農業・水産":       ["農業","水産","漁業","林業"],
+    "観光・飲食":       ["観光","飲食","宿泊","ホテル"],
+    "防災・安全":       ["防災","耐震","BCP"],
+}
 
 # 公募開始日・掲載日を探すキーワード
 START_DATE_KEYWORDS = [
@@ -46,190 +99,1012 @@ START_DATE_KEYWORDS = [
 ]
 
 EXPIRY_DAYS = 547  # 1年半 = 365 + 182
+PUBLISH_DAYS = 90  # data.json に載せる期間（取得日基準）
+ITEM_RETENTION_DAYS = 730  # ストアに残す期間（最終取得日基準）
+FULL_RESYNC_DAYS = 7  # ページ送りのある取得元を差分取得せず最後のページまで取り直す間隔（掲載後の修正を拾う）
+CHECKPOINT_MAX_AGE_DAYS = 2  # 中断した実行の続きから再開する期限。これより古いチェックポイントは捨てる
+TIME_BUDGET_RESERVE = 120  # --time-budget のうち、ストアへの統合と公開のために残しておく秒数
+DB_BATCH = 500  # ストアへの一括書き込み・IN 句の件数
 
-def make_id(url):
-    return hashlib.md5(url.encode()).hexdigest()[:16]
+# 個別ページ補完の再取得ルール
+ENRICH_STALE_DAYS = 30        # 開始日しか取れなかったページを取り直すまでの日数
+ENRICH_MAX_BACKOFF_DAYS = 32  # 失敗が続くページの再取得間隔の上限
+ENRICH_RETENTION_DAYS = 180   # これより長く取得していない記録は削除
+ENRICH_TIME_BUDGET = 300      # 個別取得に使う時間（秒）。超えたら残りは次回に回す
+ENRICH_BATCH = 20             # 個別取得の結果をこの件数ごとにストアへ書く（途中で止まっても取得済みの分は残る）
 
-def is_subsidy(title):
-    return any(kw in title for kw in SUBSIDY_KEYWORDS)
+# 個別取得の優先度スコア（高いものから取得）
+ENRICH_SCORE = {
+    "newness": 40,          # 初回掲載から ENRICH_NEW_DAYS 以内ほど加点
+    "no_start_date": 15,    # 開始日が不明（期限切れ判定ができない）
+    "failure": -10,         # 過去の失敗1回あたり
+}
+ENRICH_NEW_DAYS = 30
+SOURCE_PRIORITY = {"自治体": 20, "国・省庁": 10}
+CATEGORY_PRIORITY = {DEFAULT_CATEGORY: 0}  # 未登録のカテゴリは DEFAULT_CATEGORY_PRIORITY
+DEFAULT_CATEGORY_PRIORITY = 10
 
-def classify(title):
-    mapping = {
-        "IT・デジタル":     ["IT","DX","デジタル","AI","クラウド","ICT","システム","電子"],
-        "雇用・人材":       ["雇用","人材","採用","訓練","賃上げ","賃金","労働","働き方"],
-        "設備・機械":       ["設備","機械","装置","工場","製造","ものづくり"],
-        "創業・起業":       ["創業","起業","スタートアップ","開業"],
-        "販路拡大":         ["販路","輸出","海外","EC","展示会"],
-        "省エネ・環境":     ["省エネ","環境","脱炭素","再生可能","GX","太陽光"],
-        "研究開発":         ["研究","開発","技術","イノベーション"],
-        "融資・貸付":       ["融資","貸付","ローン","資金"],
-        "事業再構築":       ["再構築","転換","新事業","多角化"],
-        "物価・光熱費対策": ["物価","光熱費","エネルギー","電気代","燃料","高騰","物価高騰"],
-        "医療・福祉":       ["医療","診療","病院","薬局","介護","福祉","医療機関"],
-        "農業・水産":       ["農業","水産","漁業","林業"],
-        "観光・飲食":       ["観光","飲食","宿泊","ホテル"],
-        "防災・安全":       ["防災","耐震","BCP"],
-    }
-    for cat, kws in mapping.items():
-        if any(kw in title for kw in kws):
-            return cat
-    return "補助金・助成金（一般）"
+# ホストごとの取得間隔（秒）と同時接続数。未登録のホストは DEFAULT_HOST_POLICY
+DEFAULT_HOST_POLICY = {"delay": 1.0, "concurrency": 2}
+HOST_POLICY = {
+    "www.pref.kanagawa.jp": {"delay": 1.0, "concurrency": 2},
+    "www.tokyo-kosha.or.jp": {"delay": 2.0, "concurrency": 1},
+}
+MAX_WORKERS = 8  # 全ホスト合計のスレッド数
+PARSE_WORKERS = 0  # HTML の解析・抽出に使うプロセス数。0 なら取得したスレッドでそのまま解析する
 
-def parse_japanese_date(text):
-    """テキストから日付を解析してdateオブジェクトを返す"""
-    if not text:
-        return None
+# 5xx・タイムアウト時の再試行（backoff_factor 秒 × 2^n の間隔で待つ）
+RETRY_POLICY = {"total": 3, "backoff_factor": 1.0, "status_forcelist": (500, 502, 503, 504)}
 
-    # 令和X年Y月Z日
-    m = re.search(r'令和\s*(\d+)\s*年\s*(\d+)\s*月\s*(\d+)\s*日', text)
-    if m:
-        try:
-            year = 2018 + int(m.group(1))
-            month = int(m.group(2))
-            day = int(m.group(3))
-            if 2019 <= year <= 2035 and 1 <= month <= 12 and 1 <= day <= 31:
-                return date(year, month, day)
-        except:
-            pass
+# 条件付きGET用のレスポンスキャッシュ（Actions では actions/cache で実行間に引き継ぐ）
+HTTP_CACHE_DIR = Path(".cache/http")
+HTTP_CACHE_MAX_BYTES = 200 * 1024 * 1024
+HTTP_CACHE_MAX_AGE_DAYS = 14  # これより古いエントリは使わずに取り直す
+EXTRACT_VERSION = 4  # 抽出ロジックを変えたら上げる（キャッシュ済みの抽出結果を無効化）
+FEED_MAX_ENTRIES = 60  # 1つのフィードから読むエントリの上限。これより後ろは解析しない
+FEED_CHUNK = 16 * 1024  # フィードの本文を XMLPullParser に渡す単位（バイト）
+PARSER_BACKEND = "lxml"  # "lxml"（lxml の木を1回たどる）か "bs4"（BeautifulSoup。比較用）。どちらも結果は同じ
 
-    # YYYY年MM月DD日
-    m = re.search(r'(\d{4})\s*年\s*(\d+)\s*月\s*(\d+)\s*日', text)
-    if m:
-        try:
-            year, month, day = int(m.group(1)), int(m.group(2)), int(m.group(3))
-            if 2019 <= year <= 2035 and 1 <= month <= 12 and 1 <= day <= 31:
-                return date(year, month, day)
-        except:
-            pass
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+# ホストごとのリクエスト数・転送量・所要時間
+HTTP_STATS = {}
+_stats_lock = threading.Lock()
+
+# 段階ごとの所要時間・通信量・解析時間・メモリ（stage）と、HTML 解析に使った時間の累計
+STAGE_STATS = []
+PARSE_STATS = {"seconds": 0.0, "pages": 0}
+
+# 取得元ごとの計測。scrape_source の間はそのスレッドの polite_get・parse_timer が _source_local.stats に足し込む
+SOURCE_STATS = []
+_source_local = threading.local()
+
+# --profile のとき run_parallel のワーカーごとに作る cProfile（最後にメインスレッドの分とまとめる）
+_thread_profilers = None
+# 3.12 からの cProfile は sys.monitoring を使い、同時に有効にできるのは1つだけ（2つ目は「Another profiling tool is
+# already active」）。その代わり1つでワーカーのスレッドの呼び出しも拾うので、ワーカーごとには作らない
+PROFILE_PER_THREAD = sys.version_info < (3, 12)
+
+# --parse-workers のときの解析用プロセスプール
+_parse_pool = None
+
+# --time-budget から決めた、新しい取得を始めない時刻（time.monotonic 基準。None なら無制限）
+_deadline = None
+# ストアへの書き込みを取得スレッドから行うときのロック（チェックポイント）
+_db_lock = threading.Lock()
+
+def out_of_time():
+    return _deadline is not None and time.monotonic() > _deadline
+
+# --record で記録するディレクトリと、--replay で全ホストに mount するアダプター
+_record_dir = None
+_replay_adapter = None
+
+def host_policy(host):
+    return {**DEFAULT_HOST_POLICY, **HOST_POLICY.get(host, {})}
+
+def get_session():
+    """全スクレイパー共通の Session（keep-alive で接続を再利用）"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(HEADERS)
+        return _session
 
-    # YYYY-MM-DD
-    m = re.search(r'(\d{4})-(\d{2})-(\d{2})', text)
-    if m:
+def _mount(session, prefix, adapter):
+    """session.mount と同じ登録を、adapters を作り直して差し替えることで行う
+
+    Session.get_adapter はロックなしで adapters を回すので、取得中のほかのスレッドが回している辞書は変えない。
+    """
+    adapters = OrderedDict(session.adapters)
+    adapters[prefix] = adapter
+    for key in [k for k in adapters if len(k) < len(prefix)]:
+        adapters[key] = adapters.pop(key)
+    session.adapters = adapters
+
+def prepare_hosts(urls):
+    """urls のホストのスロットと接続プールを、並列に取得する前にまとめて登録する"""
+    session = get_session()
+    for url in urls:
+        parsed = urlparse(url)
+        _host_slot(parsed.netloc, parsed.scheme, session)
+
+def _host_slot(host, scheme, session):
+    """ホストごとのセマフォと次回取得可能時刻。初回にホスト専用の接続プールを登録する
+
+    取得元のホストは prepare_hosts で先に登録する。個別ページなどで後から初めて出てきたホストも _mount で登録する。
+    """
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            policy = host_policy(host)
+            slot = {
+                "sem": threading.BoundedSemaphore(policy["concurrency"]),
+                "lock": threading.Lock(),
+                "delay": policy["delay"],
+                "next": 0.0,
+                "schemes": set(),
+            }
+            _host_slots[host] = slot
+        if scheme not in slot["schemes"] and _replay_adapter is not None:
+            _mount(session, f"{scheme}://{host}/", _replay_adapter)
+            slot["delay"] = 0.0
+            slot["schemes"].add(scheme)
+        if scheme not in slot["schemes"]:
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=host_policy(host)["concurrency"],
+                max_retries=Retry(
+                    total=RETRY_POLICY["total"],
+                    backoff_factor=RETRY_POLICY["backoff_factor"],
+                    status_forcelist=RETRY_POLICY["status_forcelist"],
+                    allowed_methods=frozenset(["GET"]),
+                    raise_on_status=False,
+                ),
+            )
+            _mount(session, f"{scheme}://{host}/", adapter)
+            slot["schemes"].add(scheme)
+    return slot
+
+def _record_stats(host, nbytes, seconds, error=False):
+    with _stats_lock:
+        st = HTTP_STATS.setdefault(host, {"requests": 0, "bytes": 0, "seconds": 0.0, "errors": 0})
+        st["requests"] += 1
+        st["bytes"] += nbytes
+        st["seconds"] += seconds
+        if error:
+            st["errors"] += 1
+    src = getattr(_source_local, "stats", None)
+    if src is not None:
+        src["requests"] += 1
+        src["bytes"] += nbytes
+        src["seconds"] += seconds
+        if error:
+            src["errors"] += 1
+
+def polite_get(url, timeout=20, headers=None):
+    """ホストごとの同時接続数・取得間隔を守って GET する"""
+    parsed = urlparse(url)
+    session = get_session()
+    slot = _host_slot(parsed.netloc, parsed.scheme, session)
+    with slot["sem"]:
+        with slot["lock"]:
+            wait = slot["next"] - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            slot["next"] = time.monotonic() + slot["delay"]
+        started = time.monotonic()
         try:
-            year, month, day = int(m.group(1)), int(m.group(2)), int(m.group(3))
-            if 2019 <= year <= 2035 and 1 <= month <= 12 and 1 <= day <= 31:
-                return date(year, month, day)
-        except:
-            pass
+            res = session.get(url, timeout=timeout, headers=headers)
+        except Exception as e:
+            _record_stats(parsed.netloc, 0, time.monotonic() - started, error=True)
+            if _record_dir:
+                record_response(url, error=e)
+            raise
+        _record_stats(parsed.netloc, len(res.content), time.monotonic() - started,
+                      error=res.status_code >= 400)
+        if _record_dir:
+            record_response(url, res)
+        return res
+
+def log_http_stats():
+    """ホストごとの通信量・平均応答時間をログに出す"""
+    for host, st in sorted(HTTP_STATS.items()):
+        avg = st["seconds"] / st["requests"] if st["requests"] else 0
+        logger.info(f"  {host}: {st['requests']}件 {st['bytes'] / 1024:.0f}KB "
+                    f"平均{avg:.2f}秒 エラー{st['errors']}件")
+
+# 記録・再生。記録先には URL ごとに <sha1>.json（URL・ステータス・ヘッダー・エラー）と <sha1>.body（gzip）を置く。
+# 記録中は HTTP キャッシュを使わない（条件付き GET の 304 ではなく本文を記録するため）
+def _recording_paths(directory, url):
+    key = hashlib.sha1(url.encode()).hexdigest()
+    return Path(directory) / f"{key}.json", Path(directory) / f"{key}.body"
+
+def record_response(url, res=None, error=None):
+    """polite_get が受け取ったレスポンス（または例外）を記録先に書く"""
+    meta_path, body_path = _recording_paths(_record_dir, url)
+    meta_path.parent.mkdir(parents=True, exist_ok=True)
+    if error is not None:
+        meta = {"url": url, "error": f"{type(error).__name__}: {error}"}
+    else:
+        # 本文は展開済みで保存するので、転送時の符号化・長さのヘッダーは落とす
+        headers = {k: v for k, v in res.headers.items()
+                   if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")}
+        meta = {"url": url, "status": res.status_code, "reason": res.reason, "headers": headers}
+        body_path.write_bytes(gzip.compress(res.content, mtime=0))
+    with atomic_open(meta_path) as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+class ReplayAdapter(BaseAdapter):
+    """--replay 用のアダプター。記録したレスポンスを返し、ネットワークには出ない
+
+    ETag / Last-Modified が記録と一致する条件付き GET には 304 を返す（HTTP キャッシュも実サイトと同じように働く）。
+    記録にない URL と、記録時に失敗した URL は ConnectionError にする。
+    """
 
-    # YYYY/MM/DD
-    m = re.search(r'(\d{4})/(\d{2})/(\d{2})', text)
-    if m:
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = Path(directory)
+
+    def send(self, request, **kwargs):
+        meta_path, body_path = _recording_paths(self.directory, request.url)
         try:
-            year, month, day = int(m.group(1)), int(m.group(2)), int(m.group(3))
-            if 2019 <= year <= 2035 and 1 <= month <= 12 and 1 <= day <= 31:
-                return date(year, month, day)
-        except:
-            pass
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise requests.ConnectionError(f"記録にない URL: {request.url}", request=request)
+        if meta.get("error"):
+            raise requests.ConnectionError(meta["error"], request=request)
+        res = requests.Response()
+        res.status_code = meta["status"]
+        res.reason = meta.get("reason", "")
+        res.headers = CaseInsensitiveDict(meta["headers"])
+        res.url = request.url
+        res.request = request
+        etag, modified = res.headers.get("ETag"), res.headers.get("Last-Modified")
+        if res.status_code == 200 and (
+                (etag and request.headers.get("If-None-Match") == etag) or
+                (modified and request.headers.get("If-Modified-Since") == modified)):
+            res.status_code, res.reason, res._content = 304, "Not Modified", b""
+        else:
+            res._content = gzip.decompress(body_path.read_bytes()) if body_path.exists() else b""
+        return res
+
+    def close(self):
+        pass
+
+@contextmanager
+def stage(name):
+    """main の段階ごとの所要時間・リクエスト数・転送量・HTML 解析時間を STAGE_STATS に積む
+
+    tracemalloc が動いていれば（bench_collect.py --memory）その段階のメモリのピークも記録する。
+    """
+    def totals():
+        with _stats_lock:
+            return (sum(st["requests"] for st in HTTP_STATS.values()),
+                    sum(st["bytes"] for st in HTTP_STATS.values()),
+                    PARSE_STATS["seconds"])
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    before = totals()
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        after = totals()
+        STAGE_STATS.append({
+            "stage": name,
+            "seconds": round(time.monotonic() - started, 3),
+            "requests": after[0] - before[0],
+            "bytes": after[1] - before[1],
+            "parse_seconds": round(after[2] - before[2], 3),
+            "peak_kb": tracemalloc.get_traced_memory()[1] // 1024 if tracemalloc.is_tracing() else None,
+        })
+
+@contextmanager
+def parse_timer():
+    """HTML 解析の所要時間を PARSE_STATS に足す（並列に呼ばれるので合計はスレッドをまたいだ延べ時間）
+
+    プロセスプールで解析するときは、取得スレッドが結果を待った時間（受け渡し・順番待ちを含む）になる。
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _stats_lock:
+            PARSE_STATS["seconds"] += elapsed
+            PARSE_STATS["pages"] += 1
+        src = getattr(_source_local, "stats", None)
+        if src is not None:
+            src["parse_ms"] += elapsed * 1000
+
+def log_stage_stats():
+    for st in STAGE_STATS:
+        peak = f" メモリ最大{st['peak_kb']}KB" if st["peak_kb"] is not None else ""
+        logger.info(f"  {st['stage']}: {st['seconds']:.2f}秒 {st['requests']}件 {st['bytes'] / 1024:.0f}KB "
+                    f"解析{st['parse_seconds']:.2f}秒{peak}")
+
+def start_parse_pool(workers):
+    """解析用のプロセスプールを作る（workers が 0 なら作らない）。ワーカーには PARSER_BACKEND を引き継ぐ
+
+    取得スレッドが動いている最中に fork しないよう、ワーカーは spawn で起動する。
+    """
+    global _parse_pool
+    if workers > 0:
+        _parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                          initializer=_init_parse_worker, initargs=(PARSER_BACKEND,))
 
+def stop_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown()
+        _parse_pool = None
+
+def _init_parse_worker(backend):
+    global PARSER_BACKEND
+    PARSER_BACKEND = backend
+
+def run_parse(func, *args):
+    """func(*args) を解析用のプロセスプールで実行して結果を待つ。プールがなければこのスレッドで実行する
+
+    取得スレッドは結果が出るまで待つので、プールに積まれる解析は取得スレッドの数（MAX_WORKERS）までに収まる。
+    その間も他のスレッドは取得を続けられる（解析が GIL を握らない）。ホストの枠は polite_get が本文を受け取った
+    時点で返しているので、解析を待つ間も同じホストの取得は進む。文字コードの推定も解析側（decode_body）で行う。
+    """
+    with parse_timer():
+        if _parse_pool is None:
+            return func(*args)
+        return _parse_pool.submit(func, *args).result()
+
+def decode_body(content, encoding):
+    """requests の res.text と同じ規則で本文を文字列にする
+
+    encoding が None なら res.apparent_encoding と同じく本文から推定する（解析用プロセスで行い、取得スレッドを塞がない）。
+    """
+    if encoding is None:
+        encoding = requests.compat.chardet.detect(content)["encoding"] if requests.compat.chardet else "utf-8"
+    try:
+        return str(content, encoding, errors="replace")
+    except (LookupError, TypeError):
+        return str(content, errors="replace")
+
+def run_parallel(func, args_list, max_workers=MAX_WORKERS):
+    """func(*args) を並列実行し、結果を args_list の順で返す"""
+    if not args_list:
+        return []
+    def call(args):
+        if _thread_profilers is None:
+            return func(*args)
+        profiler = cProfile.Profile()
+        with _stats_lock:
+            _thread_profilers.append(profiler)
+        return profiler.runcall(func, *args)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(args_list))) as pool:
+        return list(pool.map(call, args_list))
+
+def _cache_paths(url):
+    key = hashlib.sha1(url.encode()).hexdigest()
+    return HTTP_CACHE_DIR / f"{key}.json", HTTP_CACHE_DIR / f"{key}.body"
+
+def _load_cache_entry(url):
+    """有効期限内のキャッシュエントリ（本文付き）を返す。なければ None"""
+    if not HTTP_CACHE_DIR:
+        return None
+    meta_path, body_path = _cache_paths(url)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            entry = json.load(f)
+        if time.time() - entry["stored_at"] > HTTP_CACHE_MAX_AGE_DAYS * 86400:
+            return None
+        entry["body"] = gzip.decompress(body_path.read_bytes())
+        return entry
+    except Exception:
+        return None
+
+def _save_cache_entry(url, entry, body=None):
+    if not HTTP_CACHE_DIR:
+        return
+    meta_path, body_path = _cache_paths(url)
+    HTTP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    if body is not None:
+        body_path.write_bytes(gzip.compress(body))
+    meta = {k: v for k, v in entry.items() if k not in ("body", "unchanged")}
+    tmp = meta_path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    tmp.replace(meta_path)
+
+def fetch_cached(url, timeout=20):
+    """ETag / Last-Modified による条件付きGET。(res, entry) を返す
+
+    304 のときはキャッシュ済みの本文で res を組み立て直す。entry["unchanged"] は
+    304 または本文ハッシュが前回と同じときに True になる。
+    """
+    entry = _load_cache_entry(url)
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    res = polite_get(url, timeout=timeout, headers=headers)
+    now = time.time()
+
+    if res.status_code == 304 and entry:
+        res.status_code = 200
+        res._content = entry["body"]
+        res.encoding = entry.get("encoding")
+        entry["validated_at"] = now
+        entry["unchanged"] = True
+        _save_cache_entry(url, entry)
+        return res, entry
+
+    if res.status_code != 200:
+        return res, {"unchanged": False}
+
+    # 文字コードはヘッダーではなく本文から推定する。推定は重いので解析側（decode_body）で行う
+    res.encoding = None
+    body_hash = hashlib.sha256(res.content).hexdigest()
+    unchanged = bool(entry) and entry.get("body_hash") == body_hash
+    new_entry = {
+        "url": url,
+        "etag": res.headers.get("ETag", ""),
+        "last_modified": res.headers.get("Last-Modified", ""),
+        "body_hash": body_hash,
+        "encoding": res.encoding,
+        "size": len(res.content),
+        "stored_at": entry["stored_at"] if unchanged else now,
+        "validated_at": now,
+        "extracted": entry.get("extracted") if unchanged else None,
+    }
+    _save_cache_entry(url, new_entry, None if unchanged else res.content)
+    new_entry["unchanged"] = unchanged
+    return res, new_entry
+
+def reusable_extraction(entry, sig):
+    """ページが未更新で、同じ抽出条件の結果が残っていればそれを返す"""
+    extracted = entry.get("extracted") if entry.get("unchanged") else None
+    if extracted and extracted.get("sig") == f"{EXTRACT_VERSION}:{sig}":
+        return extracted["data"]
     return None
 
-def extract_deadline(text):
-    """テキストから申請期限を抽出"""
-    if not text:
-        return ""
-
-    deadline_patterns = [
-        r'(?:締[切め]|期限|受付終了|申請期間|公募期間|募集期間|応募期限|提出期限).*?'
-        r'令和\s*(\d+)\s*年\s*(\d+)\s*月\s*(\d+)\s*日',
-        r'(?:締[切め]|期限|受付終了|申請期間|公募期間|募集期間|応募期限|提出期限).*?'
-        r'(\d{4})\s*年\s*(\d+)\s*月\s*(\d+)\s*日',
-        r'令和\s*(\d+)\s*年\s*(\d+)\s*月\s*(\d+)\s*日',
-        r'(\d{4})\s*年\s*(\d+)\s*月\s*(\d+)\s*日',
-        r'(\d{4})-(\d{2})-(\d{2})',
-    ]
+def save_extraction(url, sig, data):
+    """ページから抽出した結果をキャッシュエントリに保存（次回 304 のときに再利用）"""
+    if not HTTP_CACHE_DIR:
+        return
+    meta_path, _ = _cache_paths(url)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except Exception:
+        return
+    entry["extracted"] = {"sig": f"{EXTRACT_VERSION}:{sig}", "data": data}
+    _save_cache_entry(url, entry)
 
-    for pattern in deadline_patterns:
-        matches = re.findall(pattern, text)
-        if matches:
-            for m in matches:
-                try:
-                    if len(m[0]) <= 2:  # 令和
-                        year = 2018 + int(m[0])
-                    else:
-                        year = int(m[0])
-                    month = int(m[1])
-                    day = int(m[2])
-                    if 2020 <= year <= 2035 and 1 <= month <= 12 and 1 <= day <= 31:
-                        return f"令和{year-2018}年{month}月{day}日締切"
-                except:
-                    continue
-    return ""
+def prune_http_cache():
+    """期限切れエントリを削除し、合計サイズが上限を超えたら古いものから削除"""
+    if not HTTP_CACHE_DIR or not HTTP_CACHE_DIR.exists():
+        return
+    entries = []
+    now = time.time()
+    for meta_path in HTTP_CACHE_DIR.glob("*.json"):
+        body_path = meta_path.with_suffix(".body")
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                entry = json.load(f)
+            size = meta_path.stat().st_size + (body_path.stat().st_size if body_path.exists() else 0)
+        except Exception:
+            entry, size = {"stored_at": 0, "validated_at": 0}, 0
+        if now - entry.get("stored_at", 0) > HTTP_CACHE_MAX_AGE_DAYS * 86400:
+            meta_path.unlink(missing_ok=True)
+            body_path.unlink(missing_ok=True)
+            continue
+        entries.append((entry.get("validated_at", 0), size, meta_path, body_path))
+    total = sum(e[1] for e in entries)
+    removed = 0
+    for _, size, meta_path, body_path in sorted(entries, key=lambda e: e[0]):
+        if total <= HTTP_CACHE_MAX_BYTES:
+            break
+        meta_path.unlink(missing_ok=True)
+        body_path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    logger.info(f"HTTPキャッシュ: {len(entries) - removed}件 {total / 1024 / 1024:.1f}MB（削除{removed}件）")
 
-def extract_start_date_from_text(text):
-    """テキストから公募開始日・掲載日などを抽出してdateオブジェクトを返す"""
+# URL の正規化と重複の判定。同じページへのリンクは canonical_url でそろえてから make_id で id にするので、
+# 取得・補完・保存は1回で済む。別の URL に載った同じ告知（同じ制度を別の機関が載せたものなど）は
+# タイトルの指紋（title_fingerprint）で見分け、個別取得と公開から外す
+TRACKING_PARAMS = {"fbclid", "gclid", "yclid", "msclkid", "mc_cid", "mc_eid", "_ga", "_gl"}  # utm_* も落とす
+DIRECTORY_INDEXES = ("index.html", "index.htm")  # URL の末尾にあればディレクトリの URL とみなす
+# ストアの形式の版は PRAGMA user_version に1つの番号で持つ。次に変えるときはどちらも今の最大より大きい番号にする
+ID_VERSION = 2  # make_id の作り方を変えたら上げる（open_db がストアの id を付け替える）
+FINGERPRINT_VERSION = 3  # title_fingerprint の作り方を変えたら上げる（open_db がストアの指紋を付け直す）
+SIMHASH_DISTANCE = 2  # タイトルの SimHash がこのビット数以内の差なら同じ告知とみなす
+_TITLE_NOISE_RE = re.compile(r"[\W_]+")
+_DIGITS_RE = re.compile(r"\d+")
+# 同じ制度の別の区分を表す語（一般コース・賃上げ重点コース、通常枠、創業型、A類型、前期など）。長いタイトルでは
+# 区分名の違いが SimHash の数ビットにしかならないので、数字と同じく一致を条件にする
+_QUALIFIER_RE = re.compile(r"[^\W\d_]{1,10}?(?:コース|類型|部門|区分|枠|型)|[前後上下]期")
+_ID_PATH_SUFFIX_RE = re.compile(r"(/|\.html?)$")
+
+def canonical_url(url):
+    """同じページを指す URL を1つの形にそろえる
+
+    スキームとホストを小文字にし、既定のポート、フラグメント（#/ や #! で始まる画面遷移用のものは残す）、
+    計測用のクエリー（utm_* と TRACKING_PARAMS）、末尾の index.html を落とす。残りのクエリーは順序も表記もそのまま。
+    """
+    parts = urlsplit(url.strip())
+    scheme, netloc = parts.scheme.lower(), parts.netloc.lower()
+    host, _, port = netloc.rpartition(":")
+    if (scheme, port) in (("http", "80"), ("https", "443")):
+        netloc = host
+    head, _, last = (parts.path or "/").rpartition("/")
+    path = head + "/" + ("" if last.lower() in DIRECTORY_INDEXES else last)
+    query = "&".join(p for p in parts.query.split("&") if p and not is_tracking_param(p.partition("=")[0]))
+    fragment = parts.fragment if parts.fragment.startswith(("/", "!")) else ""
+    return urlunsplit((scheme, netloc, path, query, fragment))
+
+def is_tracking_param(name):
+    """計測用のクエリーパラメーターなら True"""
+    return name.startswith("utm_") or name in TRACKING_PARAMS
+
+def make_id(url):
+    """URL の id。canonical_url に加えて http と https、末尾の / や拡張子 .html の有無が違うだけの URL も同じ id にする"""
+    parts = urlsplit(canonical_url(url))
+    key = urlunsplit(("https", parts.netloc, _ID_PATH_SUFFIX_RE.sub("", parts.path), parts.query, parts.fragment))
+    return hashlib.md5(key.encode()).hexdigest()[:16]
+
+def title_fingerprint(title):
+    """タイトルの指紋 "SimHash（16進）/数字列" か "SimHash（16進）/数字列/区分"
+
+    全角・半角、空白、括弧や記号の違いを落とした文字 2-gram の 64ビット SimHash に、タイトル中の数字
+    （年度・回・号など）を - でつないで付け、区分の語（_QUALIFIER_RE）があれば + でつないで続ける。
+    数字か区分の違うタイトルは find_duplicates で別の告知として扱う。
+    """
+    normalized = unicodedata.normalize("NFKC", title).lower()
+    text = _TITLE_NOISE_RE.sub("", normalized)
+    grams = [text[i:i + 2] for i in range(len(text) - 1)] or [text]
+    weights = [0] * 64
+    for gram in grams:
+        h = int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    simhash = sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+    fingerprint = f"{simhash:016x}/{'-'.join(_DIGITS_RE.findall(text))}"
+    qualifiers = _QUALIFIER_RE.findall(normalized)
+    return f"{fingerprint}/{'+'.join(qualifiers)}" if qualifiers else fingerprint
+
+def find_duplicates(entries):
+    """(id, 都道府県, title_fingerprint) を古い順に受け取り、先に出たものと同じ告知とみなせる分の {id: 先の id}
+
+    都道府県とタイトルの数字・区分が同じもののうち、SimHash の差が SIMHASH_DISTANCE ビット以内のものを同じとみなす。
+    """
+    firsts = {}
+    dups = {}
+    for id_, pref, fingerprint in entries:
+        if not fingerprint:
+            continue
+        simhash, _, exact = fingerprint.partition("/")
+        simhash = int(simhash, 16)
+        group = firsts.setdefault((pref, exact), [])
+        for first_id, first_hash in group:
+            if bin(simhash ^ first_hash).count("1") <= SIMHASH_DISTANCE:
+                dups[id_] = first_id
+                break
+        else:
+            group.append((id_, simhash))
+    return dups
+
+# キーワード照合：キーワード群は起動時に一度だけコンパイルし、タイトルは1回の走査で照合する。
+# 長い順に並べた選択肢の正規表現で各開始位置の最長一致を拾い、同じ位置から始まる短いキーワード
+# （「物価高騰」に対する「物価」など）は事前計算した接頭辞表で補う
+def compile_keywords(keywords):
+    keywords = list(dict.fromkeys(keywords))
+    pattern = re.compile("|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)))
+    prefixes = {k: [j for j in keywords if k.startswith(j)] for k in keywords}
+    return pattern, prefixes
+
+def find_keywords(matcher, text):
+    """text に含まれるキーワードの集合"""
+    pattern, prefixes = matcher
+    found = set()
+    m = pattern.search(text)
+    while m:
+        found.update(prefixes[m.group()])
+        m = pattern.search(text, m.start() + 1)
+    return found
+
+_SUBSIDY_MATCHER = compile_keywords(SUBSIDY_KEYWORDS)
+_FEED_MATCHER = compile_keywords(FEED_KEYWORDS)
+_FEED_EXCLUDE_MATCHER = compile_keywords(FEED_EXCLUDE_KEYWORDS)
+_CATEGORY_MATCHER = compile_keywords(kw for kws in CATEGORY_KEYWORDS.values() for kw in kws)
+_CATEGORY_ORDER = {cat: i for i, cat in enumerate(CATEGORY_KEYWORDS)}
+_KEYWORD_CATEGORIES = {}
+for _cat, _kws in CATEGORY_KEYWORDS.items():
+    for _kw in _kws:
+        _KEYWORD_CATEGORIES.setdefault(_kw, []).append(_cat)
+
+def is_subsidy(title):
+    return _SUBSIDY_MATCHER[0].search(title) is not None
+
+def is_feed_subsidy(title):
+    """フィードのエントリのタイトルの判定（FEED_KEYWORDS を含み、FEED_EXCLUDE_KEYWORDS を含まない）"""
+    return _FEED_MATCHER[0].search(title) is not None and _FEED_EXCLUDE_MATCHER[0].search(title) is None
+
+def classify_all(title):
+    """該当するカテゴリをすべて [(カテゴリ, スコア)] で返す。スコアは一致したキーワード数
+
+    スコアの高い順、同点なら CATEGORY_KEYWORDS の順。
+    """
+    scores = {}
+    for kw in find_keywords(_CATEGORY_MATCHER, title):
+        for cat in _KEYWORD_CATEGORIES[kw]:
+            scores[cat] = scores.get(cat, 0) + 1
+    return sorted(scores.items(), key=lambda cs: (-cs[1], _CATEGORY_ORDER[cs[0]]))
+
+def classify(title):
+    """従来どおり CATEGORY_KEYWORDS の順で最初に該当したカテゴリを返す"""
+    matched = classify_all(title)
+    if not matched:
+        return DEFAULT_CATEGORY
+    return min(matched, key=lambda cs: _CATEGORY_ORDER[cs[0]])[0]
+
+def set_categories(item):
+    """複数カテゴリに該当するアイテムに categories（スコア順）を付ける"""
+    cats = [cat for cat, _ in classify_all(item.get("title", ""))]
+    if len(cats) > 1:
+        item["categories"] = cats
+    return item
+
+# 日付抽出：テキストを一度だけ走査して日付の出現位置・暦・直前のラベルを列挙し、
+# 申請期限・開始日・最古の日付はすべてその結果から決める
+DEADLINE_LABELS = ["締切", "締め", "期限", "受付終了", "申請期間", "公募期間", "募集期間", "応募期限", "提出期限"]
+_DEADLINE_LABEL_SET = set(DEADLINE_LABELS)
+_LABEL_KEYWORDS = sorted(set(DEADLINE_LABELS) | set(START_DATE_KEYWORDS), key=len, reverse=True)
+_LABEL_RE = re.compile("|".join(re.escape(k) for k in _LABEL_KEYWORDS))
+# 同じ位置から始まる短いキーワード（最長一致の陰に隠れるもの）
+_LABEL_PREFIXES = {k: [j for j in _LABEL_KEYWORDS if j != k and k.startswith(j)] for k in _LABEL_KEYWORDS}
+LABEL_WINDOW = 60  # 日付の何文字前までのラベルを「直前のラベル」とみなすか
+
+# 日付はすべて「年」または区切り記号（- /）を含むので、そこを起点に正規表現で前方を読み、
+# 年の数字と「令和」は後ろ向きに確かめる（数字始まりの正規表現を全位置で試すより速い）
+_NEN_RE = re.compile(r'年\s*(\d+)\s*月\s*(\d+)\s*日')
+_ISO_RE = re.compile(r'-(\d{2})-(\d{2})')
+_SLASH_RE = re.compile(r'/(\d{2})/(\d{2})')
+_CALENDARS = ("reiwa", "kanji", "iso", "slash")
+
+class DateMention(namedtuple("DateMention", "start end year month day calendar label")):
+    """テキスト中の日付1件。year は西暦、label は直前のラベルキーワード（なければ None）"""
+    __slots__ = ()
+
+    def to_date(self, min_year=2019, max_year=2035):
+        if not (min_year <= self.year <= max_year and 1 <= self.month <= 12 and 1 <= self.day <= 31):
+            return None
+        try:
+            return date(self.year, self.month, self.day)
+        except ValueError:
+            return None
+
+DateScan = namedtuple("DateScan", "text mentions labels")
+
+def _scan_labels(text, endpos):
+    """ラベルキーワードの出現位置を重なりも含めて列挙（endpos より後ろは使わないので読まない）"""
+    labels = []
+    m = _LABEL_RE.search(text, 0, endpos)
+    while m:
+        kw = m.group()
+        labels.append((m.start(), kw))
+        for short in _LABEL_PREFIXES[kw]:
+            labels.append((m.start(), short))
+        m = _LABEL_RE.search(text, m.start() + 1, endpos)
+    return labels
+
+def scan_dates(text):
+    """テキスト中の日付とラベルキーワードを一度の走査で列挙する"""
     if not text:
-        return None
+        return DateScan("", [], [])
+    raw = []
+    for m in _NEN_RE.finditer(text):
+        month, day = int(m.group(1)), int(m.group(2))
+        i = m.start()
+        while i > 0 and text[i - 1].isspace():
+            i -= 1
+        digits_end = i
+        while i > 0 and text[i - 1].isdecimal():
+            i -= 1
+        if i == digits_end:
+            continue
+        digits = text[i:digits_end]
+        j = i
+        while j > 0 and text[j - 1].isspace():
+            j -= 1
+        if text[j - 2:j] == "令和" and len(digits) <= 2:
+            raw.append((j - 2, m.end(), 2018 + int(digits), month, day, "reiwa"))
+        elif len(digits) >= 4:
+            raw.append((digits_end - 4, m.end(), int(digits[-4:]), month, day, "kanji"))
+    for pattern, calendar in ((_ISO_RE, "iso"), (_SLASH_RE, "slash")):
+        for m in pattern.finditer(text):
+            year = text[m.start() - 4:m.start()]
+            if len(year) == 4 and year.isdecimal():
+                raw.append((m.start() - 4, m.end(), int(year), int(m.group(1)), int(m.group(2)), calendar))
+    if not raw:
+        # 日付がなければラベルも不要
+        return DateScan(text, [], [])
+    raw.sort()
+    # ラベルは日付より前にあるものしか使わない
+    labels = _scan_labels(text, raw[-1][0])
 
-    for kw in START_DATE_KEYWORDS:
-        # キーワードの近くにある日付を探す
-        pattern = re.escape(kw) + r'.{0,30}'
-        m = re.search(pattern, text)
+    mentions = []
+    j = 0
+    nearest = None
+    for start, end, year, month, day, calendar in raw:
+        while j < len(labels) and labels[j][0] + len(labels[j][1]) <= start:
+            nearest = labels[j]
+            j += 1
+        label = nearest[1] if nearest and start - nearest[0] <= LABEL_WINDOW else None
+        mentions.append(DateMention(start, end, year, month, day, calendar, label))
+    return DateScan(text, mentions, labels)
+
+def _first_valid_date(mentions):
+    """暦ごとに最初の日付を 令和→YYYY年→YYYY-MM-DD→YYYY/MM/DD の順で試す"""
+    for calendar in _CALENDARS:
+        m = next((m for m in mentions if m.calendar == calendar), None)
         if m:
-            snippet = m.group(0) + text[m.end():m.end()+30]
-            d = parse_japanese_date(snippet)
+            d = m.to_date()
             if d:
                 return d
+    return None
+
+def _after_deadline_label(scan, calendar):
+    """期限系ラベルの後ろ（同じ行）にある最初の日付を、ラベルごとに重ならないよう順に集める"""
+    text = scan.text
+    mentions = [m for m in scan.mentions if m.calendar == calendar]
+    found = []
+    pos = j = 0
+    for start, kw in scan.labels:
+        if kw not in _DEADLINE_LABEL_SET or start < pos:
+            continue
+        kw_end = start + len(kw)
+        line_end = text.find("\n", kw_end)
+        if line_end < 0:
+            line_end = len(text)
+        while j < len(mentions) and mentions[j].start < kw_end:
+            j += 1
+        if j < len(mentions) and mentions[j].start < line_end:
+            found.append(mentions[j])
+            pos = mentions[j].end
+            j += 1
+    return found
 
+def deadline_mention(scan):
+    """申請期限とみなす日付。期限系ラベル直後の令和→西暦、次にラベルなしの令和→西暦→ISO の順"""
+    for calendar, labeled in (("reiwa", True), ("kanji", True), ("reiwa", False), ("kanji", False), ("iso", False)):
+        if labeled:
+            candidates = _after_deadline_label(scan, calendar)
+        else:
+            candidates = [m for m in scan.mentions if m.calendar == calendar]
+        for m in candidates:
+            if 2020 <= m.year <= 2035 and 1 <= m.month <= 12 and 1 <= m.day <= 31:
+                return m
     return None
 
-def fetch_page_info(url):
-    """個別ページから申請期限・公募開始日を取得"""
+def deadline_from_scan(scan):
+    m = deadline_mention(scan)
+    return f"令和{m.year - 2018}年{m.month}月{m.day}日締切" if m else ""
+
+def start_date_from_scan(scan):
+    """START_DATE_KEYWORDS の順に、キーワード直後（同じ行の30文字＋30文字）の日付を探す"""
+    if not scan.mentions:
+        return None
+    text = scan.text
+    first = {}
+    for start, kw in scan.labels:
+        first.setdefault(kw, start)
+    for kw in START_DATE_KEYWORDS:
+        start = first.get(kw)
+        if start is None:
+            continue
+        kw_end = start + len(kw)
+        line_end = text.find("\n", kw_end, kw_end + 30)
+        end = (line_end if line_end >= 0 else min(kw_end + 30, len(text))) + 30
+        lo = bisect_left(scan.mentions, start, key=lambda m: m.start)
+        window = [m for m in scan.mentions[lo:] if m.start < end and m.end <= end]
+        d = _first_valid_date(window)
+        if d:
+            return d
+    return None
+
+def earliest_date_from_scan(scan):
+    """令和・YYYY年表記の日付のうち最も古いもの"""
+    dates = [m.to_date() for m in scan.mentions if m.calendar in ("reiwa", "kanji")]
+    dates = [d for d in dates if d]
+    return min(dates) if dates else None
+
+def parse_japanese_date(text):
+    """テキストから日付を解析してdateオブジェクトを返す"""
+    return _first_valid_date(scan_dates(text).mentions)
+
+def extract_deadline(text):
+    """テキストから申請期限を抽出"""
+    return deadline_from_scan(scan_dates(text))
+
+def extract_start_date_from_text(text):
+    """テキストから公募開始日・掲載日などを抽出してdateオブジェクトを返す"""
+    return start_date_from_scan(scan_dates(text))
+
+# 個別ページで申請期限を探す文字列のキーワード（この順に、見つかった文字列の親要素のテキストから期限を探す）
+PAGE_DEADLINE_KEYWORDS = ["締切", "期限", "受付終了", "申請期間", "公募期間", "募集期間", "受付期間"]
+_PAGE_DEADLINE_RE = re.compile("|".join(PAGE_DEADLINE_KEYWORDS))
+
+# BeautifulSoup がタグごとに別の種類の文字列として持つ要素。get_text はその要素と同じ種類の文字列だけをつなぐ
+# （div の get_text に script・style・template・ルビの中身は入らない）。コメントと処理命令は get_text に入らない
+_STRING_CONTAINERS = frozenset(["rt", "rp", "style", "script", "template"])
+
+# huge_tree でも libxml2 はこの深さで解析をやめ、以降の内容を黙って捨てる。ここまで届いた文書は BeautifulSoup で解析する
+LXML_MAX_DEPTH = 2048
+
+class TreeTooDeep(Exception):
+    """html_strings の木が LXML_MAX_DEPTH で切れている"""
+
+def html_strings(html):
+    """HTML を lxml で解析し、文字列ノードを文書順に1回だけ集める。(root, strings, spans) を返す
+
+    strings は (文字列, 種類, 親要素) のリスト。種類は直近の _STRING_CONTAINERS の祖先の名前（なければ None）、
+    コメントは "comment"、処理命令は "pi"。spans は要素ごとの子孫の文字列の範囲 (開始, 終了)。
+    BeautifulSoup(html, "lxml") と同じ木・同じ文字列になる（空の文書は root が None）。
+    入れ子が LXML_MAX_DEPTH 段に届いた文書は木が途中で切れているので TreeTooDeep を送出する。
+    """
+    # huge_tree: 既定では libxml2 が 256 段より深い入れ子を捨てる（BeautifulSoup では捨てない）
+    parser = etree.HTMLParser(huge_tree=True)
+    parser.feed(html)
     try:
-        res = requests.get(url, headers=HEADERS, timeout=15)
-        if res.status_code != 200:
-            return "", None
-        res.encoding = res.apparent_encoding
-        soup = BeautifulSoup(res.text, "lxml")
-
-        main = soup.find("main") or soup.find(id="content") or soup.find(class_="content") or soup
-
-        # 申請期限を取得
-        deadline = ""
-        deadline_keywords = ["締切","期限","受付終了","申請期間","公募期間","募集期間","受付期間"]
-        for kw in deadline_keywords:
-            for tag in main.find_all(string=re.compile(kw)):
-                parent = tag.parent
-                text = parent.get_text(" ", strip=True)
-                deadline = extract_deadline(text)
-                if deadline:
-                    break
+        root = parser.close()
+    except etree.XMLSyntaxError:
+        root = None
+    if root is None:
+        return None, [], {}
+    strings, spans = [], {}
+    # <html> の外のコメントは文書全体（root）の子として扱う（後ろのものは走査の後に足す）
+    for node in reversed(list(root.itersiblings(preceding=True))):
+        if node.tag is etree.Comment:
+            strings.append((node.text or "", "comment", root))
+
+    # 文書順にたどる。再帰すると深い入れ子で RecursionError になるので、スタックに (操作, 対象, 種類, 深さ) として
+    # 要素 ("element", 要素) / 文字列 ("string", 文字列の組) / 要素の終わり ("end", (要素, 開始位置)) を積む
+    stack = [("element", root, None, 1)]
+    while stack:
+        op, node, kind, depth = stack.pop()
+        if op == "string":
+            strings.append(node)
+            continue
+        if op == "end":
+            el, start = node
+            spans[el] = (start, len(strings))
+            continue
+        if depth >= LXML_MAX_DEPTH:
+            raise TreeTooDeep(f"入れ子が{depth}段")
+        el = node
+        if el.tag in _STRING_CONTAINERS:
+            kind = el.tag
+        stack.append(("end", (el, len(strings)), None, None))
+        if el.text:
+            strings.append((el.text, kind, el))
+        # 後に積んだものから取り出すので、子は逆順に「tail → 子自身」の順で積む
+        for child in reversed(el):
+            if child.tail:
+                stack.append(("string", (child.tail, kind, el), None, None))
+            if isinstance(child.tag, str):
+                stack.append(("element", child, kind, depth + 1))
+            elif child.tag is etree.Comment:
+                stack.append(("string", (child.text or "", "comment", el), None, None))
+            elif child.tag is etree.ProcessingInstruction:
+                stack.append(("string", (f"{child.target} {child.text or ''}", "pi", el), None, None))
+
+    for node in root.itersiblings():
+        if node.tag is etree.Comment:
+            strings.append((node.text or "", "comment", root))
+    spans[root] = (0, len(strings))
+    return root, strings, spans
+
+def element_text(strings, spans, el, separator=""):
+    """BeautifulSoup の el.get_text(separator, strip=True) と同じテキスト"""
+    start, end = spans[el]
+    kind = el.tag if el.tag in _STRING_CONTAINERS else None
+    return separator.join(t for t in (s.strip() for s, k, _ in strings[start:end] if k == kind) if t)
+
+def element_string(el):
+    """BeautifulSoup の el.string（中身が文字列1つならその文字列、要素1つならその要素の .string、それ以外は None）"""
+    while True:
+        contents = (1 if el.text else 0) + sum(2 if child.tail else 1 for child in el)
+        if contents != 1:
+            return None
+        if el.text:
+            return el.text
+        child = el[0]
+        if child.tag is etree.Comment:
+            return child.text or ""
+        if child.tag is etree.ProcessingInstruction:
+            return f"{child.target} {child.text or ''}"
+        el = child
+
+def _main_element(root):
+    """本文の要素。main → id="content" → class に content を含む要素 → 文書全体 の順に探す"""
+    for el in root.iter("main"):
+        return el
+    for el in root.iter(etree.Element):
+        if el.get("id") == "content":
+            return el
+    for el in root.iter(etree.Element):
+        if "content" in (el.get("class") or "").split():
+            return el
+    return root
+
+def parse_page_info(html):
+    """個別ページのHTMLから (申請期限, 公募開始日) を抽出"""
+    if PARSER_BACKEND == "bs4":
+        deadline, full_text = _page_text_bs4(html)
+    else:
+        deadline, full_text = _page_text_lxml(html)
+
+    # 公募開始日を取得（本文の日付は一度だけ走査する）
+    scan = scan_dates(full_text)
+
+    # まずキーワード近辺から探し、見つからなければページ内で最も古い日付を開始日と見なす
+    start_date = start_date_from_scan(scan) or earliest_date_from_scan(scan)
+
+    if not deadline:
+        deadline = deadline_from_scan(scan)
+
+    return deadline, start_date
+
+def _page_text_bs4(html):
+    """キーワードを含む文字列の親要素から取った申請期限と、本文のテキスト（BeautifulSoup 版）"""
+    soup = BeautifulSoup(html, "lxml")
+
+    main = soup.find("main") or soup.find(id="content") or soup.find(class_="content") or soup
+
+    # 申請期限を取得
+    deadline = ""
+    for kw in PAGE_DEADLINE_KEYWORDS:
+        for tag in main.find_all(string=re.compile(kw)):
+            parent = tag.parent
+            text = parent.get_text(" ", strip=True)
+            deadline = extract_deadline(text)
             if deadline:
                 break
+        if deadline:
+            break
+    return deadline, main.get_text(" ", strip=True)
 
-        # 公募開始日を取得
-        start_date = None
-        full_text = main.get_text(" ", strip=True)
+def _page_text_lxml(html):
+    """_page_text_bs4 と同じ結果を、文字列ノードの1回の走査で求める
 
-        # まずキーワード近辺から探す
-        start_date = extract_start_date_from_text(full_text)
+    キーワードを含む文字列を一度に集めてからキーワードの順に見て、親要素のテキストと期限は親ごとに1回だけ作る。
+    """
+    try:
+        root, strings, spans = html_strings(html)
+    except TreeTooDeep:
+        return _page_text_bs4(html)
+    if root is None:
+        return "", ""
+    main = _main_element(root)
+    start, end = spans[main]
+    hits = [(s, parent) for s, _, parent in strings[start:end] if _PAGE_DEADLINE_RE.search(s)]
+    deadlines = {}
+    for kw in PAGE_DEADLINE_KEYWORDS:
+        for s, parent in hits:
+            if kw not in s:
+                continue
+            if parent not in deadlines:
+                deadlines[parent] = extract_deadline(element_text(strings, spans, parent, " "))
+            if deadlines[parent]:
+                return deadlines[parent], element_text(strings, spans, main, " ")
+    return "", element_text(strings, spans, main, " ")
 
-        # 見つからなければページ全体の最初の日付（最も古い日付）を使う
-        if not start_date:
-            all_dates = []
-            # 令和X年
-            for m in re.finditer(r'令和\s*(\d+)\s*年\s*(\d+)\s*月\s*(\d+)\s*日', full_text):
-                try:
-                    d = date(2018 + int(m.group(1)), int(m.group(2)), int(m.group(3)))
-                    if 2019 <= d.year <= 2035:
-                        all_dates.append(d)
-                except:
-                    pass
-            # YYYY年
-            for m in re.finditer(r'(\d{4})\s*年\s*(\d+)\s*月\s*(\d+)\s*日', full_text):
-                try:
-                    d = date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
-                    if 2019 <= d.year <= 2035:
-                        all_dates.append(d)
-                except:
-                    pass
-            if all_dates:
-                # 最も古い日付を開始日と見なす
-                start_date = min(all_dates)
-
-        if not deadline:
-            deadline = extract_deadline(full_text)
+def parse_page_info_body(content, encoding):
+    """本文のバイト列から parse_page_info する（解析用プロセスに渡す入口）"""
+    return parse_page_info(decode_body(content, encoding))
 
+def fetch_page_info(url):
+    """個別ページから申請期限・公募開始日を取得。未更新ならキャッシュの抽出結果を使う"""
+    try:
+        res, entry = fetch_cached(url, timeout=15)
+        if res.status_code != 200:
+            return "", None
+        cached = reusable_extraction(entry, "page_info")
+        if cached is not None:
+            start_date = date.fromisoformat(cached["start_date"]) if cached["start_date"] else None
+            return cached["deadline"], start_date
+        deadline, start_date = run_parse(parse_page_info_body, res.content, res.encoding)
+        save_extraction(url, "page_info", {
+            "deadline": deadline,
+            "start_date": str(start_date) if start_date else "",
+        })
         return deadline, start_date
 
     except Exception as e:
@@ -242,286 +1117,395 @@ def is_expired_by_start_date(start_date):
         return False
     return (date.today() - start_date).days >= EXPIRY_DAYS
 
-def enrich_items(items, max_fetch=60):
-    """期限未取得のアイテムについて個別ページから期限・開始日を取得"""
+def load_enrich_store(db):
+    """個別ページ補完の結果ストア {id: {url, deadline, start_date, fetched_at, failures, next_try}}"""
+    rows = db.execute("SELECT id, url, deadline, start_date, fetched_at, failures, next_try FROM enrichment")
+    return {
+        row[0]: {"url": row[1], "deadline": row[2], "start_date": row[3],
+                 "fetched_at": row[4], "failures": row[5], "next_try": row[6]}
+        for row in rows
+    }
+
+def save_enrich_records(db, store, ids):
+    """個別取得の途中経過として、ids の記録だけをストアに書く"""
+    rows = [(k, store[k]["url"], store[k]["deadline"], store[k]["start_date"], store[k].get("fetched_at", ""),
+             store[k]["failures"], store[k].get("next_try", "")) for k in ids]
+    with _db_lock, db:
+        db.executemany("INSERT OR REPLACE INTO enrichment VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+def save_enrich_store(db, store):
+    """一定期間取得していない記録を落として保存"""
+    cutoff = str(date.today() - timedelta(days=ENRICH_RETENTION_DAYS))
+    rows = [
+        (k, v["url"], v["deadline"], v["start_date"], v.get("fetched_at", ""), v["failures"], v.get("next_try", ""))
+        for k, v in store.items() if v.get("fetched_at", "") >= cutoff
+    ]
+    with db:
+        db.execute("DELETE FROM enrichment")
+        for i in range(0, len(rows), DB_BATCH):
+            db.executemany("INSERT INTO enrichment VALUES (?, ?, ?, ?, ?, ?, ?)", rows[i:i + DB_BATCH])
+
+def apply_enrichment(item, deadline, start_date):
+    """補完結果をアイテムに反映"""
+    if deadline:
+        item["deadline"] = deadline
+    if start_date:
+        item["start_date"] = str(start_date)
+        # 開始日から1年半以上経過 → 期限切れフラグ
+        if is_expired_by_start_date(start_date) and not item.get("deadline"):
+            item["expired_by_age"] = True
+
+def record_enrichment(store, item, deadline, start_date):
+    """取得結果をストアに記録。何も取れなければ失敗回数に応じて次回取得日を先送りする"""
+    today = date.today()
+    rec = store.get(item["id"]) or {"url": item["url"], "deadline": "", "start_date": "", "failures": 0}
+    rec["fetched_at"] = str(today)
+    if deadline:
+        rec["deadline"] = deadline
+    if start_date:
+        rec["start_date"] = str(start_date)
+    if deadline or start_date:
+        rec["failures"] = 0
+        rec["next_try"] = str(today + timedelta(days=ENRICH_STALE_DAYS))
+    else:
+        rec["failures"] += 1
+        backoff = min(2 ** (rec["failures"] - 1), ENRICH_MAX_BACKOFF_DAYS)
+        rec["next_try"] = str(today + timedelta(days=backoff))
+    store[item["id"]] = rec
+
+def enrich_score(item, rec=None, first_seen=None):
+    """個別取得の優先度。新しさ・ソース・カテゴリ・開始日の有無・過去の失敗回数から計算"""
+    today = date.today()
+    try:
+        seen = date.fromisoformat(first_seen or item.get("date", ""))
+        age = max((today - seen).days, 0)
+    except ValueError:
+        age = ENRICH_NEW_DAYS
+    score = ENRICH_SCORE["newness"] * max(ENRICH_NEW_DAYS - age, 0) / ENRICH_NEW_DAYS
+    score += SOURCE_PRIORITY.get(item.get("source"), 0)
+    score += CATEGORY_PRIORITY.get(item.get("category"), DEFAULT_CATEGORY_PRIORITY)
+    if not item.get("start_date"):
+        score += ENRICH_SCORE["no_start_date"]
+    if rec:
+        score += ENRICH_SCORE["failure"] * rec.get("failures", 0)
+    return score
+
+def schedule_enrichment(candidates, store, first_seen=None):
+    """候補をスコア順に並べる。同点なら機関ごとに交互になるよう、機関内の順位で並べる"""
+    first_seen = first_seen or {}
+    org_rank = {}
+    keyed = []
+    for i, item in enumerate(candidates):
+        rank = org_rank.get(item.get("org"), 0)
+        org_rank[item.get("org")] = rank + 1
+        score = enrich_score(item, store.get(item["id"]), first_seen.get(item["id"]))
+        keyed.append((-score, rank, i, item))
+    keyed.sort(key=lambda k: k[:3])
+    return [k[3] for k in keyed]
+
+def enrich_items(items, max_fetch=60, store=None, time_budget=ENRICH_TIME_BUDGET, first_seen=None,
+                 checkpoint=None):
+    """期限未取得のアイテムについて個別ページから期限・開始日を取得
+
+    store に記録済みのURLは取得せず結果を再利用する。期限まで取れたものは二度と取得せず、
+    開始日だけのものは ENRICH_STALE_DAYS 後、失敗が続くものは指数的に間隔を空けて再取得する。
+    残りは優先度順に max_fetch 件・time_budget 秒（--time-budget の残りがそれより短ければその残り）の
+    範囲で取得する。ENRICH_BATCH 件ごとに、記録した id のリストで checkpoint を呼ぶ。
+    今回届かなかった件数（deferred）は今回の候補の中だけの数で、次回に残る積み残しは統合後に enrich_backlog で数える。
+    """
+    if store is None:
+        store = {}
+    today = str(date.today())
     no_deadline = [item for item in items if not item.get("deadline")]
-    logger.info(f"期限未取得: {len(no_deadline)}件 → 最大{max_fetch}件を個別取得")
-    fetched = 0
+    candidates = []
+    reused = waiting = 0
     for item in no_deadline:
-        if fetched >= max_fetch:
-            break
         if "jgrants-portal" in item.get("url", ""):
             continue
-        deadline, start_date = fetch_page_info(item["url"])
-        if deadline:
-            item["deadline"] = deadline
-        if start_date:
-            item["start_date"] = str(start_date)
-            # 開始日から1年半以上経過 → 期限切れフラグ
-            if is_expired_by_start_date(start_date) and not item.get("deadline"):
-                item["expired_by_age"] = True
-        fetched += 1
-        time.sleep(0.5)
-    logger.info(f"個別取得完了: {fetched}件処理")
-    return items
-
-def scrape_page(url, pref, org, link_pattern=None, title_filter=True, fetch_detail=False):
-    items = []
-    try:
-        res = requests.get(url, headers=HEADERS, timeout=20)
-        logger.info(f"  {org}: {res.status_code} ({url[-60:]})")
-        if res.status_code != 200:
-            return items
-        res.encoding = res.apparent_encoding
-        soup = BeautifulSoup(res.text, "lxml")
-        parsed_base = urlparse(url)
-        for a in soup.find_all("a", href=True):
-            title = a.get_text(strip=True)
-            href = a["href"]
-            if not title or len(title) < 8:
-                continue
-            if title_filter and not is_subsidy(title):
+        rec = store.get(item["id"])
+        if rec:
+            start_date = date.fromisoformat(rec["start_date"]) if rec["start_date"] else None
+            apply_enrichment(item, rec["deadline"], start_date)
+            if rec["deadline"]:
+                reused += 1
                 continue
-            if href.startswith("http"):
-                full_url = href
-            elif href.startswith("/"):
-                full_url = f"{parsed_base.scheme}://{parsed_base.netloc}{href}"
-            else:
+            if rec.get("next_try", "") > today:
+                waiting += 1
                 continue
-            if link_pattern and not re.search(link_pattern, href):
+        candidates.append(item)
+    logger.info(f"期限未取得: {len(no_deadline)}件（取得済み再利用{reused}件・再取得待ち{waiting}件）"
+                f" → 最大{max_fetch}件・{time_budget}秒を優先度順に個別取得")
+
+    ordered = schedule_enrichment(candidates, store, first_seen)
+    targets = ordered[:max_fetch]
+    stop_at = time.monotonic() + time_budget
+    if _deadline is not None:
+        stop_at = min(stop_at, _deadline)
+
+    def _fetch(item):
+        # 時間切れ後に回ってきた分は取得せずに残す（優先度の低いものから溢れる）
+        if time.monotonic() > stop_at:
+            return None
+        return fetch_page_info(item["url"])
+
+    fetched = 0
+    deferred = len(ordered) - len(targets)
+    prepare_hosts(item["url"] for item in targets)
+    for i in range(0, len(targets), ENRICH_BATCH):
+        batch = targets[i:i + ENRICH_BATCH]
+        recorded = []
+        for item, result in zip(batch, run_parallel(_fetch, [(item,) for item in batch])):
+            if result is None:
+                deferred += 1
                 continue
+            deadline, start_date = result
+            apply_enrichment(item, deadline, start_date)
+            record_enrichment(store, item, deadline, start_date)
+            recorded.append(item["id"])
+            fetched += 1
+        if checkpoint is not None and recorded:
+            checkpoint(recorded)
 
-            parent_text = ""
-            for p in [a.parent, a.parent.parent if a.parent else None]:
-                if p:
-                    parent_text = p.get_text(" ", strip=True)
-                    break
-            deadline = extract_deadline(parent_text)
-            # リスト上の日付から開始日も推定
-            start_date_obj = extract_start_date_from_text(parent_text)
-
-            item = {
-                "id": make_id(full_url),
-                "title": title[:120],
-                "org": org,
-                "pref": pref,
-                "amount": "",
-                "deadline": deadline,
-                "target": "",
-                "category": classify(title),
-                "url": full_url,
-                "source": "自治体",
-                "date": str(date.today()),
-            }
-            if start_date_obj:
-                item["start_date"] = str(start_date_obj)
-                if is_expired_by_start_date(start_date_obj) and not deadline:
-                    item["expired_by_age"] = True
+    logger.info(f"個別取得完了: {fetched}件処理（今回の候補のうち届かなかったもの{deferred}件）")
+    return {
+        "candidates": len(candidates),
+        "fetched": fetched,
+        "reused": reused,
+        "waiting": waiting,
+        "deferred": deferred,
+    }
 
-            items.append(item)
-        logger.info(f"    → {len(items)}件")
-    except Exception as e:
-        logger.warning(f"  エラー ({org}): {e}")
-    return items
+def refresh_item(item):
+    """キャッシュから復元したアイテムの取得日・経過判定を今日基準に更新"""
+    item = dict(item, date=str(date.today()))
+    item.pop("expired_by_age", None)
+    if item.get("start_date") and not item.get("deadline"):
+        if is_expired_by_start_date(date.fromisoformat(item["start_date"])):
+            item["expired_by_age"] = True
+    return item
+
+def parse_listing(html, page_url, pref, org, link_pattern=None, title_filter=True, base=None):
+    """一覧ページのリンクから補助金アイテムを抽出。(items, 次ページリンクの有無) を返す
 
-def scrape_tokyo_portal():
+    base を指定すると、/ で始まる相対リンクをページの URL ではなくそのホストで解決する。
+    """
+    if PARSER_BACKEND == "bs4":
+        links, has_next = _listing_links_bs4(html)
+    else:
+        links, has_next = _listing_links_lxml(html)
     items = []
-    seen = set()
-    target_urls = [
-        ("https://www.sangyo-rodo.metro.tokyo.lg.jp/chushou/shoko/jyosei/", "東京都産業労働局"),
-        ("https://www.hokeniryo.metro.tokyo.lg.jp/iryo/jigyo/h_gaiyou/", "東京都保健医療局"),
-    ]
-    for url, org in target_urls:
-        try:
-            res = requests.get(url, headers=HEADERS, timeout=20)
-            logger.info(f"  {org}: {res.status_code} ({url[-60:]})")
-            if res.status_code != 200:
-                continue
-            res.encoding = res.apparent_encoding
-            soup = BeautifulSoup(res.text, "lxml")
-            parsed_base = urlparse(url)
-            for a in soup.find_all("a", href=True):
-                title = a.get_text(strip=True)
-                href = a["href"]
-                if not title or len(title) < 8:
-                    continue
-                if not is_subsidy(title):
-                    continue
-                if href.startswith("http"):
-                    full_url = href
-                elif href.startswith("/"):
-                    full_url = f"{parsed_base.scheme}://{parsed_base.netloc}{href}"
-                else:
-                    continue
-                if full_url in seen:
-                    continue
-                seen.add(full_url)
-                parent_text = ""
-                for p in [a.parent, a.parent.parent if a.parent else None]:
-                    if p:
-                        parent_text = p.get_text(" ", strip=True)
-                        break
-                deadline = extract_deadline(parent_text)
-                start_date_obj = extract_start_date_from_text(parent_text)
-
-                item = {
-                    "id": make_id(full_url),
-                    "title": title[:120],
-                    "org": org,
-                    "pref": "東京都",
-                    "amount": "",
-                    "deadline": deadline,
-                    "target": "",
-                    "category": classify(title),
-                    "url": full_url,
-                    "source": "自治体",
-                    "date": str(date.today()),
-                }
-                if start_date_obj:
-                    item["start_date"] = str(start_date_obj)
-                    if is_expired_by_start_date(start_date_obj) and not deadline:
-                        item["expired_by_age"] = True
+    parsed_base = urlparse(base or page_url)
+    for title, href, parent_text in links:
+        if not title or len(title) < 8:
+            continue
+        if title_filter and not is_subsidy(title):
+            continue
+        if href.startswith("http"):
+            full_url = href
+        elif href.startswith("/"):
+            full_url = f"{parsed_base.scheme}://{parsed_base.netloc}{href}"
+        else:
+            continue
+        if link_pattern and not re.search(link_pattern, href):
+            continue
+        full_url = canonical_url(full_url)
+
+        scan = scan_dates(parent_text())
+        deadline = deadline_from_scan(scan)
+        # リスト上の日付から開始日も推定
+        start_date_obj = start_date_from_scan(scan)
 
+        item = {
+            "id": make_id(full_url),
+            "title": title[:120],
+            "org": org,
+            "pref": pref,
+            "amount": "",
+            "deadline": deadline,
+            "target": "",
+            "category": classify(title),
+            "url": full_url,
+            "source": "自治体",
+            "date": str(date.today()),
+        }
+        set_categories(item)
+        if start_date_obj:
+            item["start_date"] = str(start_date_obj)
+            if is_expired_by_start_date(start_date_obj) and not deadline:
+                item["expired_by_age"] = True
+
+        items.append(item)
+    return items, has_next
+
+def _listing_links_bs4(html):
+    """一覧ページのリンクの (タイトル, href, 親要素のテキスト) と次ページリンクの有無（BeautifulSoup 版）"""
+    soup = BeautifulSoup(html, "lxml")
+    links = []
+    for a in soup.find_all("a", href=True):
+        # 親要素のテキストは対象のリンクでだけ作る
+        links.append((a.get_text(strip=True), a["href"], lambda a=a: a.parent.get_text(" ", strip=True)))
+    has_next = soup.find("a", string=re.compile("次")) is not None
+    return links, has_next
+
+def _listing_links_lxml(html):
+    """_listing_links_bs4 と同じ結果を lxml で。親要素のテキストは同じ親のリンクの間で使い回す"""
+    try:
+        root, strings, spans = html_strings(html)
+    except TreeTooDeep:
+        return _listing_links_bs4(html)
+    if root is None:
+        return [], False
+    links, parent_texts, has_next = [], {}, False
+    for a in root.iter("a"):
+        if not has_next:
+            string = element_string(a)
+            has_next = string is not None and "次" in string
+        href = a.get("href")
+        if href is None:
+            continue
+        def parent_text(parent=a.getparent()):
+            if parent not in parent_texts:
+                parent_texts[parent] = element_text(strings, spans, parent, " ")
+            return parent_texts[parent]
+        links.append((element_text(strings, spans, a), href, parent_text))
+    return links, has_next
+
+def parse_listing_body(content, encoding, page_url, pref, org, link_pattern=None, title_filter=True, base=None):
+    """本文のバイト列から parse_listing する（解析用プロセスに渡す入口）"""
+    return parse_listing(decode_body(content, encoding), page_url, pref, org, link_pattern, title_filter, base)
+
+def fetch_listing(url, pref, org, link_pattern=None, title_filter=True, base=None):
+    """一覧ページを取得して (HTTPステータス, items, 次ページ有無) を返す。未更新ならキャッシュの抽出結果を使う"""
+    res, entry = fetch_cached(url, timeout=20)
+    if res.status_code != 200:
+        return res.status_code, [], False
+    sig = json.dumps(["listing", pref, org, link_pattern, title_filter, base], ensure_ascii=False)
+    cached = reusable_extraction(entry, sig)
+    if cached is not None:
+        return 200, [refresh_item(item) for item in cached["items"]], cached["has_next"]
+    items, has_next = run_parse(parse_listing_body, res.content, res.encoding, url, pref, org,
+                                link_pattern, title_filter, base)
+    save_extraction(url, sig, {"items": items, "has_next": has_next})
+    return 200, items, has_next
+
+# RSS 1.0・2.0 / Atom のフィード。本文は FEED_CHUNK ずつ XMLPullParser に渡し、エントリ（item / entry）を
+# 読み終えるたびにアイテムにして要素を捨てる（木全体は作らず、FEED_MAX_ENTRIES 件で解析をやめる）。
+# 外部実体・ネットワークは解決しない
+def parse_feed_body(content, feed_url, pref, org, title_filter=True):
+    """フィードの本文のバイト列から、エントリのアイテムを載っている順に返す（解析用プロセスに渡す入口）"""
+    parser = etree.XMLPullParser(events=("end",), recover=True, resolve_entities=False, no_network=True)
+    items = []
+    entries = 0
+    for i in range(0, len(content), FEED_CHUNK):
+        parser.feed(content[i:i + FEED_CHUNK])
+        for _, el in parser.read_events():
+            if etree.QName(el).localname not in ("item", "entry"):
+                continue
+            item = feed_item(el, feed_url, pref, org, title_filter)
+            if item:
                 items.append(item)
-            logger.info(f"    → {len(items)}件累計")
-            time.sleep(2)
-        except Exception as e:
-            logger.warning(f"  東京都ポータルエラー ({org}): {e}")
+            el.clear()
+            while el.getprevious() is not None:
+                del el.getparent()[0]
+            entries += 1
+            if entries >= FEED_MAX_ENTRIES:
+                return items
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        pass
     return items
 
-def scrape_kanagawa_tag(pages=5):
-    items = []
-    seen = set()
-    base = "https://www.pref.kanagawa.jp/search/tag.html"
-    for tag_id in ["26", "27"]:
-        for page in range(1, pages + 1):
-            url = f"{base}?q={tag_id}&page={page}"
-            try:
-                res = requests.get(url, headers=HEADERS, timeout=20)
-                logger.info(f"  神奈川タグ{tag_id}(p{page}): {res.status_code}")
-                if res.status_code != 200:
-                    break
-                res.encoding = res.apparent_encoding
-                soup = BeautifulSoup(res.text, "lxml")
-                found = 0
-                for a in soup.find_all("a", href=True):
-                    title = a.get_text(strip=True)
-                    href = a["href"]
-                    if not title or len(title) < 8:
-                        continue
-                    if not is_subsidy(title):
-                        continue
-                    if href.startswith("/"):
-                        full_url = f"https://www.pref.kanagawa.jp{href}"
-                    elif href.startswith("http"):
-                        full_url = href
-                    else:
-                        continue
-                    if full_url in seen:
-                        continue
-                    seen.add(full_url)
-                    found += 1
-                    parent_text = ""
-                    for p in [a.parent, a.parent.parent if a.parent else None]:
-                        if p:
-                            parent_text = p.get_text(" ", strip=True)
-                            break
-                    deadline = extract_deadline(parent_text)
-                    start_date_obj = extract_start_date_from_text(parent_text)
-
-                    item = {
-                        "id": make_id(full_url),
-                        "title": title[:120],
-                        "org": "神奈川県",
-                        "pref": "神奈川県",
-                        "amount": "",
-                        "deadline": deadline,
-                        "target": "",
-                        "category": classify(title),
-                        "url": full_url,
-                        "source": "自治体",
-                        "date": str(date.today()),
-                    }
-                    if start_date_obj:
-                        item["start_date"] = str(start_date_obj)
-                        if is_expired_by_start_date(start_date_obj) and not deadline:
-                            item["expired_by_age"] = True
-
-                    items.append(item)
-                logger.info(f"    → 新規{found}件")
-                if not soup.find("a", string=re.compile("次")):
-                    break
-                time.sleep(1)
-            except Exception as e:
-                logger.warning(f"  神奈川タグエラー: {e}")
-                break
-        time.sleep(2)
+def feed_item(el, feed_url, pref, org, title_filter=True):
+    """エントリの要素をアイテムにする。タイトルかリンクがなければ None
 
-    health_urls = [
-        ("https://www.pref.kanagawa.jp/div/1336/index.html", "神奈川県健康医療局"),
-        ("https://www.pref.kanagawa.jp/menu/2/6/31/index.html", "神奈川県医療政策"),
-    ]
-    for url, org in health_urls:
-        try:
-            res = requests.get(url, headers=HEADERS, timeout=20)
-            logger.info(f"  {org}: {res.status_code} ({url[-60:]})")
-            if res.status_code != 200:
-                continue
-            res.encoding = res.apparent_encoding
-            soup = BeautifulSoup(res.text, "lxml")
-            found = 0
-            for a in soup.find_all("a", href=True):
-                title = a.get_text(strip=True)
-                href = a["href"]
-                if not title or len(title) < 8:
-                    continue
-                if not is_subsidy(title):
-                    continue
-                if href.startswith("/"):
-                    full_url = f"https://www.pref.kanagawa.jp{href}"
-                elif href.startswith("http"):
-                    full_url = href
-                else:
-                    continue
-                if full_url in seen:
-                    continue
-                seen.add(full_url)
-                found += 1
-                parent_text = ""
-                for p in [a.parent, a.parent.parent if a.parent else None]:
-                    if p:
-                        parent_text = p.get_text(" ", strip=True)
-                        break
-                deadline = extract_deadline(parent_text)
-                start_date_obj = extract_start_date_from_text(parent_text)
-
-                item = {
-                    "id": make_id(full_url),
-                    "title": title[:120],
-                    "org": org,
-                    "pref": "神奈川県",
-                    "amount": "",
-                    "deadline": deadline,
-                    "target": "",
-                    "category": classify(title),
-                    "url": full_url,
-                    "source": "自治体",
-                    "date": str(date.today()),
-                }
-                if start_date_obj:
-                    item["start_date"] = str(start_date_obj)
-                    if is_expired_by_start_date(start_date_obj) and not deadline:
-                        item["expired_by_age"] = True
+    リンクは link（Atom は rel="alternate" の href）、なければ URL 形式の guid / id か rdf:about。
+    期限・開始日は一覧の親要素と同じくタイトルと概要の日付から拾い、開始日がなければ掲載日を使う。
+    """
+    fields = {}
+    link = None
+    for child in el:
+        if not isinstance(child.tag, str):
+            continue
+        name = etree.QName(child).localname
+        if name == "link":
+            href = child.get("href")
+            if href is None:
+                link = link or (child.text or "").strip()
+            elif child.get("rel", "alternate") == "alternate":
+                link = link or href.strip()
+        else:
+            fields.setdefault(name, "".join(child.itertext()).strip())
+    title = fields.get("title", "")
+    if not title or title_filter and not is_feed_subsidy(title):
+        return None
+    for key in ("guid", "id"):
+        if not link and fields.get(key, "").startswith("http"):
+            link = fields[key]
+    link = link or el.get("{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about", "")
+    if not link:
+        return None
+    full_url = canonical_url(urljoin(feed_url, link))
 
-                items.append(item)
-            logger.info(f"    → 新規{found}件")
-            time.sleep(2)
-        except Exception as e:
-            logger.warning(f"  神奈川健康医療局エラー ({org}): {e}")
+    scan = scan_dates(" ".join(filter(None, (title, fields.get("description"), fields.get("summary")))))
+    deadline = deadline_from_scan(scan)
+    start_date_obj = start_date_from_scan(scan) or feed_date(
+        fields.get("date") or fields.get("pubDate") or fields.get("published") or fields.get("updated"))
+    item = {
+        "id": make_id(full_url),
+        "title": title[:120],
+        "org": org,
+        "pref": pref,
+        "amount": "",
+        "deadline": deadline,
+        "target": "",
+        "category": classify(title),
+        "url": full_url,
+        "source": "国・省庁" if pref == "全国" else "自治体",
+        "date": str(date.today()),
+    }
+    set_categories(item)
+    if start_date_obj:
+        item["start_date"] = str(start_date_obj)
+        if is_expired_by_start_date(start_date_obj) and not deadline:
+            item["expired_by_age"] = True
+    return item
 
-    logger.info(f"  神奈川合計: {len(items)}件")
-    return items
+def feed_date(text):
+    """dc:date・Atom の published（ISO 8601）か RSS 2.0 の pubDate（RFC 822）の日付。読めなければ None"""
+    text = (text or "").strip()
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(text).date()
+    except (TypeError, ValueError):
+        return None
 
+def fetch_feed(url, pref, org, title_filter=True):
+    """フィードを条件付き GET で取得して (HTTPステータス, items) を返す。未更新ならキャッシュの抽出結果を使う"""
+    res, entry = fetch_cached(url, timeout=20)
+    if res.status_code != 200:
+        return res.status_code, []
+    sig = json.dumps(["feed", pref, org, title_filter], ensure_ascii=False)
+    cached = reusable_extraction(entry, sig)
+    if cached is not None:
+        return 200, [refresh_item(item) for item in cached["items"]]
+    items = run_parse(parse_feed_body, res.content, url, pref, org, title_filter)
+    save_extraction(url, sig, {"items": items})
+    return 200, items
+
+# 取得元の定義。キー:
+#   url          一覧ページの URL。ページ送りがある場合は {page} にページ番号（1始まり）が入る
+#   pref, org    アイテムに付ける都道府県・実施機関
+#   pages        ページ送りの上限。「次」リンクがなくなるか取得に失敗した時点で打ち切る（既定 1）。
+#                2 以上の取得元は既知のアイテムだけのページで止める差分取得になる（fetch_sources）
+#   link_pattern href がこの正規表現に一致するリンクだけを対象にする
+#   title_filter False ならタイトルが補助金キーワード（フィードは FEED_KEYWORDS）を含まないリンクも対象にする（既定 True）
+#   base         / で始まる相対リンクを解決するホスト（既定は一覧ページ自身）
+#   feed         True なら url は RSS / Atom のフィード（FEED_TARGETS。pages・link_pattern・base は使わない）
+# 同じ URL のアイテムが複数の取得元に現れた場合は、この並び（SCRAPE_TARGETS → FEED_TARGETS）で先にあるものを採用する
 SCRAPE_TARGETS = [
     # 東京都
     {
@@ -556,113 +1540,1409 @@ SCRAPE_TARGETS = [
         "url": "https://www.pref.chiba.lg.jp/keishi/index.html",
         "pref": "千葉県", "org": "千葉県商工労働部",
     },
+    # 東京都ポータル
+    {
+        "url": "https://www.sangyo-rodo.metro.tokyo.lg.jp/chushou/shoko/jyosei/",
+        "pref": "東京都", "org": "東京都産業労働局",
+    },
+    {
+        "url": "https://www.hokeniryo.metro.tokyo.lg.jp/iryo/jigyo/h_gaiyou/",
+        "pref": "東京都", "org": "東京都保健医療局",
+    },
+    # 神奈川県（タグ検索・健康医療局）
+    {
+        "url": "https://www.pref.kanagawa.jp/search/tag.html?q=26&page={page}",
+        "pref": "神奈川県", "org": "神奈川県",
+        "pages": 5,
+    },
+    {
+        "url": "https://www.pref.kanagawa.jp/search/tag.html?q=27&page={page}",
+        "pref": "神奈川県", "org": "神奈川県",
+        "pages": 5,
+    },
+    {
+        "url": "https://www.pref.kanagawa.jp/div/1336/index.html",
+        "pref": "神奈川県", "org": "神奈川県健康医療局",
+    },
+    {
+        "url": "https://www.pref.kanagawa.jp/menu/2/6/31/index.html",
+        "pref": "神奈川県", "org": "神奈川県医療政策",
+    },
 ]
 
-def main():
-    all_new_items = []
-    seen_ids = set()
-
-    logger.info("=== 1都3県 公式サイトスクレイピング ===")
-    for target in SCRAPE_TARGETS:
-        title_filter = target.get("title_filter", True)
-        items = scrape_page(
-            target["url"], target["pref"], target["org"],
-            target.get("link_pattern"), title_filter
-        )
-        for item in items:
-            if item["id"] not in seen_ids:
+# 省庁と道府県の新着情報フィード（旧 docs/docs/scripts/collect.py の RSS_SOURCES）
+FEED_TARGETS = [
+    {"url": "https://www.meti.go.jp/feed/topics.rdf", "pref": "全国", "org": "経済産業省", "feed": True},
+    {"url": "https://www.mhlw.go.jp/rss/topics.rdf", "pref": "全国", "org": "厚生労働省", "feed": True},
+    {"url": "https://www.chusho.meti.go.jp/rss/news.rdf", "pref": "全国", "org": "中小企業庁", "feed": True},
+    {"url": "https://www.soumu.go.jp/menu_kyotsuu/whatsnew/rss.xml", "pref": "全国", "org": "総務省", "feed": True},
+    {"url": "https://www.pref.kanagawa.jp/prs/list.xml", "pref": "神奈川県", "org": "神奈川県", "feed": True},
+    {"url": "https://www.pref.osaka.lg.jp/rss/hodo/index.rdf", "pref": "大阪府", "org": "大阪府", "feed": True},
+    {"url": "https://www.pref.aichi.jp/rss/news/index.rdf", "pref": "愛知県", "org": "愛知県", "feed": True},
+    {"url": "https://www.pref.fukuoka.lg.jp/rss/news.rdf", "pref": "福岡県", "org": "福岡県", "feed": True},
+    {"url": "https://www.pref.saitama.lg.jp/rss/atom/newsrelease.xml", "pref": "埼玉県", "org": "埼玉県", "feed": True},
+    {"url": "https://www.pref.chiba.lg.jp/rss/news.xml", "pref": "千葉県", "org": "千葉県", "feed": True},
+    {"url": "https://web.pref.hyogo.lg.jp/rss/news.rdf", "pref": "兵庫県", "org": "兵庫県", "feed": True},
+    {"url": "https://www.pref.hiroshima.lg.jp/rss/news.rdf", "pref": "広島県", "org": "広島県", "feed": True},
+    {"url": "https://www.pref.hokkaido.lg.jp/rss/news.rdf", "pref": "北海道", "org": "北海道", "feed": True},
+    {"url": "https://www.pref.shizuoka.jp/rss/atom/top.xml", "pref": "静岡県", "org": "静岡県", "feed": True},
+    {"url": "https://www.pref.kyoto.jp/rss/index.rdf", "pref": "京都府", "org": "京都府", "feed": True},
+    {"url": "https://www.pref.miyagi.jp/rss/news.rdf", "pref": "宮城県", "org": "宮城県", "feed": True},
+]
+SOURCES = SCRAPE_TARGETS + FEED_TARGETS
+
+def scrape_source(source, known_ids=None, newest_id=None):
+    """取得元1件の一覧ページを取得して (ページごとのアイテム, 計測) を返す
+
+    ページ送りは「次」リンクの有無で決まるため、同じ取得元のページは順番に取得する。
+    known_ids を渡すと差分取得になり、前回の最新アイテム（newest_id）が載っているか、アイテムがすべて
+    既知の id のページまで取得したら止める（一覧は新しい順なので、その先のページは取得済みのはず）。
+    取得しなかったページのアイテムで期限が未取得のものは、run が pending_enrichment でストアから
+    個別取得の候補に戻す。
+    """
+    pages = []
+    stats = new_source_stats(source)
+    stats["incremental"] = known_ids is not None
+    _source_local.stats = stats
+    try:
+        for page in range(1, source.get("pages", 1) + 1):
+            if out_of_time():
+                # 途中までのページは今回の結果に使うが、チェックポイントには残さない（次回は最初から取得する）
+                stats["complete"] = False
+                break
+            url = source["url"].format(page=page)
+            try:
+                status, items, has_next = fetch_listing(
+                    url, source["pref"], source["org"], source.get("link_pattern"),
+                    source.get("title_filter", True), source.get("base"))
+            except Exception as e:
+                logger.warning(f"  エラー ({source['org']}): {e} ({url[-60:]})")
+                stats["status"] = type(e).__name__
+                break
+            logger.info(f"  {source['org']}: {status} ({url[-60:]})")
+            stats["status"] = status
+            if status != 200:
+                break
+            stats["pages"] += 1
+            pages.append(items)
+            if not has_next:
+                break
+            if known_ids is not None and items and (
+                    any(item["id"] == newest_id for item in items) or
+                    all(item["id"] in known_ids for item in items)):
+                stats["early_stop"] = True
+                break
+    finally:
+        _source_local.stats = None
+    return pages, stats
+
+def read_feed(source, known_ids=None):
+    """フィード1件を取得して ([アイテム], 計測) を返す（scrape_source のフィード版）
+
+    known_ids を渡すと、その id のエントリ（ストアに取り込み済み）は返さない。期限が未取得のままのものは
+    run が pending_enrichment でストアから個別取得の候補に戻す。
+    """
+    stats = new_source_stats(source)
+    stats["incremental"] = known_ids is not None
+    if out_of_time():
+        stats["complete"] = False
+        return [], stats
+    _source_local.stats = stats
+    try:
+        try:
+            status, items = fetch_feed(source["url"], source["pref"], source["org"], source.get("title_filter", True))
+        except Exception as e:
+            logger.warning(f"  エラー ({source['org']}): {e} ({source['url'][-60:]})")
+            stats["status"] = type(e).__name__
+            return [], stats
+        stats["status"] = status
+        if status != 200:
+            logger.info(f"  {source['org']}: {status} ({source['url'][-60:]})")
+            return [], stats
+        stats["pages"] = 1
+        known = 0
+        if known_ids is not None:
+            known = sum(1 for item in items if item["id"] in known_ids)
+            items = [item for item in items if item["id"] not in known_ids]
+        logger.info(f"  {source['org']}: {status} 新着{len(items)}件・取得済み{known}件 ({source['url'][-60:]})")
+        return [items], stats
+    finally:
+        _source_local.stats = None
+
+def new_source_stats(source):
+    return {"org": source["org"], "url": source["url"], "pages": 0, "status": None, "requests": 0,
+            "bytes": 0, "seconds": 0.0, "errors": 0, "parse_ms": 0.0, "complete": True, "resumed": False,
+            "incremental": False, "early_stop": False}
+
+def fetch_sources(sources, db=None, full=False):
+    """取得元を並列に取得し、取得元ごとの (ページごとのアイテム, 計測) を定義順に返す
+
+    db を渡すと、取得を終えた取得元ごとにチェックポイントを書き、中断した実行のチェックポイントがあれば
+    その取得元は取得せずに保存済みのページを使う（重複排除は combine_sources で全体を定義順に通すので、
+    中断しなかった場合と同じ結果になる）。
+    ページ送りのある取得元は、ストアの id を既知として差分取得する。初回と、最後に最後のページまで
+    取得してから FULL_RESYNC_DAYS 日たった取得元、full が真のときは全ページを取得する。
+    フィードはストアにある id のエントリを除いて返す。差分取得で取得しなかったページやフィードの既知
+    エントリの個別取得は、ここではなく run の補完（pending_enrichment）で行う。
+    """
+    done = load_checkpoint(db) if db is not None else {}
+    if done:
+        logger.info(f"  チェックポイントから再開: {len(done)}件の取得元は取得済み")
+    states = load_source_state(db) if db is not None and not full else {}
+    resync_before = str(date.today() - timedelta(days=FULL_RESYNC_DAYS))
+    incremental = {source["url"]: states[source["url"]]["newest_id"] for source in sources
+                   if source.get("pages", 1) > 1 and source["url"] in states
+                   and states[source["url"]]["last_full"] > resync_before}
+    feeds = db is not None and any(source.get("feed") for source in sources)
+    known_ids = {row[0] for row in db.execute("SELECT id FROM items")} if incremental or feeds else None
+
+    def fetch(source):
+        if source["url"] in done:
+            stats = new_source_stats(source)
+            stats.update(pages=len(done[source["url"]]), resumed=True)
+            return done[source["url"]], stats
+        if out_of_time():
+            stats = new_source_stats(source)
+            stats["complete"] = False
+            return [], stats
+        if source.get("feed"):
+            pages, stats = read_feed(source, known_ids)
+        elif source["url"] in incremental:
+            pages, stats = scrape_source(source, known_ids, incremental[source["url"]])
+        else:
+            pages, stats = scrape_source(source)
+        if db is not None and stats["complete"]:
+            save_checkpoint(db, source, pages)
+            if source.get("pages", 1) > 1:
+                save_source_state(db, source, pages, full=not stats["incremental"] and stats["status"] == 200)
+        return pages, stats
+
+    prepare_hosts(source["url"] for source in sources)
+    return run_parallel(fetch, [(s,) for s in sources])
+
+def combine_sources(sources, results, seen_ids=None):
+    """fetch_sources の結果を、共有の重複排除インデックス（id）を通して定義順に結合する
+
+    取得元ごとの計測は SOURCE_STATS に積む（found は一覧上の件数、unique は他の取得元と重複しない件数）。
+    """
+    seen_ids = set() if seen_ids is None else seen_ids
+    new_items = []
+    for source, (pages, stats) in zip(sources, results):
+        found = 0
+        ids = []
+        for items in pages:
+            found += len(items)
+            for item in items:
+                if item["id"] in seen_ids:
+                    continue
                 seen_ids.add(item["id"])
-                all_new_items.append(item)
-        time.sleep(2)
-
-    logger.info("=== 東京都ポータル ===")
-    for item in scrape_tokyo_portal():
-        if item["id"] not in seen_ids:
-            seen_ids.add(item["id"])
-            all_new_items.append(item)
-
-    logger.info("=== 神奈川県（タグ検索＋健康医療局）===")
-    for item in scrape_kanagawa_tag(pages=5):
-        if item["id"] not in seen_ids:
-            seen_ids.add(item["id"])
-            all_new_items.append(item)
-
-    # 期限未取得の自治体アイテムを個別ページから補完（開始日も取得）
-    logger.info("=== 期限・開始日情報を個別ページから補完 ===")
-    local_new = [i for i in all_new_items if i.get("source") == "自治体"]
-    enrich_items(local_new, max_fetch=60)
+                new_items.append(item)
+                ids.append(item["id"])
+        logger.info(f"    → {source['org']}: 新規{len(ids)}件")
+        stats.update(found=found, unique=len(ids), seconds=round(stats["seconds"], 3),
+                     parse_ms=round(stats["parse_ms"], 1), _ids=ids)
+        SOURCE_STATS.append(stats)
+    return new_items
 
-    logger.info(f"新規スクレイピング合計: {len(all_new_items)}件")
+def load_checkpoint(db):
+    """中断した実行で取得を終えた取得元の {URL: ページごとのアイテム}。CHECKPOINT_MAX_AGE_DAYS より古い分は消す"""
+    cutoff = str(date.today() - timedelta(days=CHECKPOINT_MAX_AGE_DAYS))
+    with _db_lock, db:
+        db.execute("DELETE FROM checkpoint WHERE saved_at < ?", (cutoff,))
+    return {url: json.loads(pages) for url, pages in db.execute("SELECT source, pages FROM checkpoint")}
+
+def save_checkpoint(db, source, pages):
+    """取得を終えた取得元のページごとのアイテムを保存する（取得スレッドから呼ばれる）"""
+    with _db_lock, db:
+        db.execute("INSERT OR REPLACE INTO checkpoint (source, saved_at, pages) VALUES (?, ?, ?)",
+                   (source["url"], str(date.today()), json.dumps(pages, ensure_ascii=False)))
+
+def load_source_state(db):
+    """ページ送りのある取得元ごとの {URL: {newest_id, last_full}}"""
+    with _db_lock:
+        rows = db.execute("SELECT source, newest_id, last_full FROM source_state").fetchall()
+    return {url: {"newest_id": newest_id, "last_full": last_full} for url, newest_id, last_full in rows}
+
+def save_source_state(db, source, pages, full):
+    """取得した一覧の先頭のアイテム（最新）を記録する。最後のページまで取得したら last_full も進める"""
+    newest_id = next((items[0]["id"] for items in pages if items), None)
+    with _db_lock, db:
+        db.execute("INSERT INTO source_state (source) VALUES (?) ON CONFLICT (source) DO NOTHING", (source["url"],))
+        if newest_id:
+            db.execute("UPDATE source_state SET newest_id = ? WHERE source = ?", (newest_id, source["url"]))
+        if full:
+            db.execute("UPDATE source_state SET last_full = ? WHERE source = ?", (str(date.today()), source["url"]))
+
+def clear_checkpoint(db):
+    """すべての取得元を取得し終えてストアに統合したら、次の実行は最初から取得する"""
+    with _db_lock, db:
+        db.execute("DELETE FROM checkpoint")
+
+def save_interrupted(db, after_seq):
+    """中断した実行が追加したアイテム（seq が after_seq より大きいもの）を interrupted に記録する"""
+    with db:
+        db.execute("INSERT OR IGNORE INTO interrupted SELECT id FROM items WHERE seq > ?", (after_seq,))
+
+def rollback_interrupted(db):
+    """前回の中断した実行が追加したアイテムをストアから消し、消した件数を返す
+
+    中断した実行は取得できた分だけを先に seq を振って追加するので、そのままだと再開した実行の分と並び順・
+    重複の判定（どちらを残すか）・既知の id（差分取得の止まる位置）が中断しなかった場合と変わる。
+    再開した実行がチェックポイントと残りの取得元から同じアイテムを取得し直して改めて追加するので、
+    中断しなかった場合と同じ結果になる（補完の記録は enrichment にあるので取得し直さない）。
+    """
+    with db:
+        removed = db.execute("DELETE FROM items WHERE id IN (SELECT id FROM interrupted)").rowcount
+        db.execute("DELETE FROM interrupted")
+    return removed
+
+# 分担取得（--shard i/N で取得元を分けて取得し、--reduce でまとめて補完・統合・公開する）
+def shard_of(source, count):
+    """取得元の分担番号（1〜count）。URL のハッシュで決まるので、取得元の追加・並べ替えで他の取得元は動かない"""
+    return int(hashlib.sha1(source["url"].encode()).hexdigest(), 16) % count + 1
+
+def parse_shard(value):
+    """--shard の「i/N」を (i, N) にする"""
+    try:
+        index, count = (int(v) for v in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"i/N の形で指定してください: {value}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"1 ≦ i ≦ N で指定してください: {value}")
+    return index, count
+
+def write_partial(directory, index, count, sources, results):
+    """分担した取得元の fetch_sources の結果を <directory>/shard-<i>-of-<N>.json に書く"""
+    path = Path(directory) / f"shard-{index}-of-{count}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    doc = {
+        "shard": index,
+        "shards": count,
+        "stages": STAGE_STATS,
+        "sources": [{"url": source["url"], "pages": pages, "stats": stats}
+                    for source, (pages, stats) in zip(sources, results)],
+    }
+    with atomic_open(path) as f:
+        json.dump(doc, f, ensure_ascii=False)
+    return path
+
+def load_partials(directory, sources):
+    """部分結果を読み、sources の定義順の fetch_sources の結果と、分担ごとの段階別の計測を返す
+
+    結合（重複排除）はここで全取得元を定義順に通すので、分担数によらず1回で取得した場合と同じ結果になる。
+    部分結果のない取得元（分担のジョブが失敗した等）は取得できなかったものとして扱う。
+    """
+    found, shards, counts = {}, [], set()
+    for path in sorted(Path(directory).glob("shard-*-of-*.json")):
+        with open(path, encoding="utf-8") as f:
+            doc = json.load(f)
+        counts.add(doc["shards"])
+        shards.append({"shard": doc["shard"], "stages": doc["stages"]})
+        for entry in doc["sources"]:
+            found[entry["url"]] = (entry["pages"], entry["stats"])
+    if len(counts) > 1:
+        raise ValueError(f"分担数の異なる部分結果が混ざっています: {sorted(counts)}")
+    results = []
+    for source in sources:
+        if source["url"] in found:
+            results.append(found[source["url"]])
+        else:
+            logger.warning(f"  部分結果なし ({source['org']}): {source['url'][-60:]}")
+            stats = new_source_stats(source)
+            stats["complete"] = False
+            results.append(([], stats))
+    logger.info(f"部分結果: {len(shards)}件（分担数 {', '.join(map(str, sorted(counts))) or '-'}）")
+    return results, sorted(shards, key=lambda st: st["shard"])
+
+def count_new_by_source(db):
+    """SOURCE_STATS の各取得元に、ストアにまだ無い件数（new）を入れる。store_items の前に呼ぶ"""
+    for stats in SOURCE_STATS:
+        ids = stats.pop("_ids", [])
+        known = set()
+        for i in range(0, len(ids), DB_BATCH):
+            chunk = ids[i:i + DB_BATCH]
+            sql = f"SELECT id FROM items WHERE id IN ({', '.join('?' * len(chunk))})"
+            known.update(row[0] for row in db.execute(sql, chunk))
+        stats["new"] = len(ids) - len(known)
+
+# 既存アイテムに同じ id の新規取得分が来たときのフィールドごとの扱い
+#   fill      既存が空のときだけ新しい値で埋める
+#   enriched  補完の記録（個別ページ）に値があればそれで上書きし、なければ fill と同じ
+#             （一覧から推定した値より個別ページの値を優先する。先に一覧の値でストアに入ったものも同じ結果にする）
+#   sticky    新しい値が真なら上書きする（一度立ったフラグは落とさない）
+MERGE_RULES = {
+    "deadline": "fill",
+    "start_date": "enriched",
+    "expired_by_age": "sticky",
+}
+
+def merge_record(ex, item, rec=None):
+    """MERGE_RULES に従って item の値を既存レコード ex に反映（rec は item の補完の記録）"""
+    for field, rule in MERGE_RULES.items():
+        if rule == "enriched" and rec and rec.get(field):
+            ex[field] = rec[field]
+            continue
+        value = item.get(field)
+        if not value:
+            continue
+        if rule in ("fill", "enriched") and not ex.get(field):
+            ex[field] = value
+        elif rule == "sticky":
+            ex[field] = value
+
+# アイテムのストア。data の JSON がアイテムそのもので、残りの列は検索・並べ替え用の写し。
+# published は前回 data.json に書き出したアイテム（差分の基準）。
+# seq は公開時の並び順（大きいほど新しい）、first_seen / last_seen は初回・最終取得日。
+# deadline_date・expires_on・status は item_row で data と列の両方に書く（set_item_status）。
+# fingerprint はタイトルの指紋（item_row で付ける）、duplicate_of は同じ告知とみなした先のアイテムの id で、
+# 空でないものは公開しない（mark_duplicates）。
+# interrupted は時間切れで中断した実行が追加したアイテムの id（次の実行の最初に rollback_interrupted で取り消す）
+DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    pref TEXT NOT NULL DEFAULT '',
+    category TEXT NOT NULL DEFAULT '',
+    date TEXT NOT NULL DEFAULT '',
+    start_date TEXT NOT NULL DEFAULT '',
+    deadline TEXT NOT NULL DEFAULT '',
+    expired_by_age INTEGER NOT NULL DEFAULT 0,
+    first_seen TEXT NOT NULL DEFAULT '',
+    last_seen TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    deadline_date TEXT NOT NULL DEFAULT '',
+    expires_on TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT '',
+    fingerprint TEXT NOT NULL DEFAULT '',
+    duplicate_of TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS items_pref ON items (pref);
+CREATE INDEX IF NOT EXISTS items_category ON items (category);
+CREATE INDEX IF NOT EXISTS items_date ON items (date);
+CREATE INDEX IF NOT EXISTS items_last_seen ON items (last_seen);
+CREATE TABLE IF NOT EXISTS published (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS enrichment (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    deadline TEXT NOT NULL DEFAULT '',
+    start_date TEXT NOT NULL DEFAULT '',
+    fetched_at TEXT NOT NULL DEFAULT '',
+    failures INTEGER NOT NULL DEFAULT 0,
+    next_try TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS checkpoint (
+    source TEXT PRIMARY KEY,
+    saved_at TEXT NOT NULL,
+    pages TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS source_state (
+    source TEXT PRIMARY KEY,
+    newest_id TEXT NOT NULL DEFAULT '',
+    last_full TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS interrupted (
+    id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS runs (
+    started TEXT PRIMARY KEY,
+    report TEXT NOT NULL
+);
+"""
+
+# 後から追加した列。既存のストアには open_db で ALTER TABLE してから索引を張る
+DB_ADDED_COLUMNS = {
+    "deadline_date": "TEXT NOT NULL DEFAULT ''",
+    "expires_on": "TEXT NOT NULL DEFAULT ''",
+    "status": "TEXT NOT NULL DEFAULT ''",
+    "fingerprint": "TEXT NOT NULL DEFAULT ''",
+    "duplicate_of": "TEXT NOT NULL DEFAULT ''",
+}
+DB_ADDED_INDEXES = """
+CREATE INDEX IF NOT EXISTS items_expires_on ON items (expires_on);
+CREATE INDEX IF NOT EXISTS items_status ON items (status);
+"""
+
+_ITEM_FIELDS = ("id", "seq", "pref", "category", "date", "start_date", "deadline", "expired_by_age",
+                "first_seen", "last_seen", "data", "deadline_date", "expires_on", "status", "fingerprint")
+_ITEM_UPDATES = ", ".join(f"{c} = excluded.{c}" for c in _ITEM_FIELDS
+                          if c not in ("id", "seq", "first_seen", "last_seen"))
+_ITEM_INSERT = f"INSERT INTO items ({', '.join(_ITEM_FIELDS)}) VALUES ({', '.join('?' * len(_ITEM_FIELDS))}) "
+_UPSERT_SEEN = _ITEM_INSERT + f"ON CONFLICT (id) DO UPDATE SET {_ITEM_UPDATES}, last_seen = excluded.last_seen"
+_UPSERT_EDIT = _ITEM_INSERT + f"ON CONFLICT (id) DO UPDATE SET {_ITEM_UPDATES}"
+
+def open_db(path=DB_FILE):
+    """ストアを開く。空なら data.json と旧形式の補完結果を取り込む
+
+    チェックポイントは取得スレッドから書くので、スレッドをまたいで使えるように開く（書き込みは _db_lock で直列化）。
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.executescript(DB_SCHEMA)
+    migrate_db(db)
+    if db.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0:
+        import_history(db)
+    if ENRICH_STATE_FILE.exists():
+        import_enrich_state(db)
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version < ID_VERSION:
+        migrate_ids(db)
+    if version < FINGERPRINT_VERSION:
+        refresh_fingerprints(db)
+    return db
+
+def migrate_db(db):
+    """古いストアに DB_ADDED_COLUMNS の列を足し、既存の行を書き直して値を埋める"""
+    columns = {row[1] for row in db.execute("PRAGMA table_info(items)")}
+    missing = [c for c in DB_ADDED_COLUMNS if c not in columns]
+    with db:
+        for column in missing:
+            db.execute(f"ALTER TABLE items ADD COLUMN {column} {DB_ADDED_COLUMNS[column]}")
+    db.executescript(DB_ADDED_INDEXES)
+    if missing:
+        rows = [item_row(*row) for row in query_rows(db, "1")]
+        write_items(db, rows, _UPSERT_EDIT)
+        logger.info(f"ストアに列を追加: {', '.join(missing)}（{len(rows)}件を更新）")
+
+def migrate_ids(db):
+    """id の作り方（make_id）を変えたストアの id を付け替える
 
-    existing = []
-    if HISTORY_FILE.exists():
-        with open(HISTORY_FILE, encoding="utf-8") as f:
-            try: existing = json.load(f).get("items", [])
-            except: existing = []
-
-    for item in existing:
-        if item.get("pref") == "全国":
-            title = item.get("title","") + item.get("org","")
-            for kanto in KANTO_PREFS:
-                if kanto in title:
-                    item["pref"] = kanto
+    URL を canonical_url にそろえて id を振り直し、同じ id になった行は seq の小さい（先に載った）行に
+    MERGE_RULES でまとめる（first_seen は早い方、last_seen は遅い方）。補完結果も付け替え、同じ id になった
+    記録は取得日の新しい方を残す。古い id を持つチェックポイントと差分取得の記録は捨てる（次回は全ページ取得）。
+    公開済みの記録（published）はそのままにして、付け替わったアイテムは次の差分で削除と追加として配る。
+    """
+    groups = {}
+    for item, seq, first_seen, last_seen in sorted(query_rows(db, "1"), key=lambda row: row[1]):
+        groups.setdefault(make_id(item["url"]), []).append((item, seq, first_seen, last_seen))
+    stale, rows = [], []
+    for new_id, group in groups.items():
+        if len(group) == 1 and group[0][0]["id"] == new_id and group[0][0]["url"] == canonical_url(group[0][0]["url"]):
+            continue
+        ex, seq, first_seen, last_seen = group[0]
+        for item, _, seen_first, seen_last in group[1:]:
+            merge_record(ex, item)
+            first_seen, last_seen = min(first_seen, seen_first), max(last_seen, seen_last)
+        stale.extend((item["id"],) for item, *_ in group)
+        ex.update(id=new_id, url=canonical_url(ex["url"]))
+        rows.append(item_row(ex, seq, first_seen, last_seen))
+
+    store = {}
+    for id_, rec in load_enrich_store(db).items():
+        rec["url"] = canonical_url(rec["url"])
+        new_id = make_id(rec["url"])
+        if new_id not in store or rec.get("fetched_at", "") > store[new_id].get("fetched_at", ""):
+            store[new_id] = rec
+    save_enrich_store(db, store)
+    with db:
+        db.executemany("DELETE FROM items WHERE id = ?", stale)
+        db.executemany(_ITEM_INSERT, rows)
+        db.execute("DELETE FROM checkpoint")
+        db.execute("DELETE FROM source_state")
+        db.execute(f"PRAGMA user_version = {ID_VERSION}")
+    logger.info(f"ストアの id を付け替え: {len(stale)}件 → {len(rows)}件")
+
+def refresh_fingerprints(db):
+    """title_fingerprint を変えたストアの指紋を付け直す（duplicate_of は次の mark_duplicates で付け直る）"""
+    rows = [(title_fingerprint(json.loads(data).get("title", "")), id_)
+            for id_, data in db.execute("SELECT id, data FROM items")]
+    with db:
+        for i in range(0, len(rows), DB_BATCH):
+            db.executemany("UPDATE items SET fingerprint = ? WHERE id = ?", rows[i:i + DB_BATCH])
+        db.execute(f"PRAGMA user_version = {FINGERPRINT_VERSION}")
+    logger.info(f"ストアの指紋を付け直し: {len(rows)}件")
+
+def import_history(db):
+    """data.json のアイテムを公開時の並びのまま（先頭ほど大きい seq で）取り込む"""
+    if not HISTORY_FILE.exists():
+        return
+    rows = []
+    count = 0
+    try:
+        for item in iter_history_items(HISTORY_FILE):
+            if "categories" not in item:
+                set_categories(item)
+            seen = item.get("date", "")
+            rows.append(item_row(item, -count, seen, seen))
+            count += 1
+            if len(rows) >= DB_BATCH:
+                write_items(db, rows)
+                rows = []
+    except ValueError as e:
+        logger.warning(f"data.json の読み込みを途中で打ち切り: {e}")
+    write_items(db, rows)
+    logger.info(f"ストアを作成: data.json から{count}件を取り込み")
+
+def import_enrich_state(db):
+    """旧形式（JSON）の補完結果を取り込んでファイルを削除"""
+    with open(ENRICH_STATE_FILE, encoding="utf-8") as f:
+        try: store = json.load(f)
+        except: store = {}
+    current = load_enrich_store(db)
+    store.update(current)
+    save_enrich_store(db, store)
+    ENRICH_STATE_FILE.unlink()
+    logger.info(f"補完結果を取り込み: {len(store)}件")
+
+def item_row(item, seq, first_seen, last_seen):
+    """_ITEM_FIELDS の順の行。書き込む前に期限・状態の正規化フィールドを付け直す"""
+    set_item_status(item)
+    return (
+        item["id"], seq, item.get("pref", ""), item.get("category", ""), item.get("date", ""),
+        item.get("start_date", ""), item.get("deadline", ""), int(bool(item.get("expired_by_age"))),
+        first_seen, last_seen, json.dumps(item, ensure_ascii=False),
+        item["deadline_date"], item["expires_on"], item["status"], title_fingerprint(item.get("title", "")),
+    )
+
+def write_items(db, rows, sql=_UPSERT_SEEN):
+    """item_row の行を DB_BATCH 件ずつ書き込む"""
+    with db:
+        for i in range(0, len(rows), DB_BATCH):
+            db.executemany(sql, rows[i:i + DB_BATCH])
+
+def fetch_rows(db, ids):
+    """id で引いた {id: (item, seq, first_seen, last_seen)}"""
+    found = {}
+    ids = list(ids)
+    for i in range(0, len(ids), DB_BATCH):
+        chunk = ids[i:i + DB_BATCH]
+        sql = ("SELECT id, data, seq, first_seen, last_seen FROM items "
+               f"WHERE id IN ({', '.join('?' * len(chunk))})")
+        for row in db.execute(sql, chunk):
+            found[row[0]] = (json.loads(row[1]), row[2], row[3], row[4])
+    return found
+
+def query_rows(db, where, params=()):
+    """条件に合う (item, seq, first_seen, last_seen) のリスト"""
+    sql = f"SELECT data, seq, first_seen, last_seen FROM items WHERE {where}"
+    return [(json.loads(row[0]), row[1], row[2], row[3]) for row in db.execute(sql, params)]
+
+def store_items(db, new_items, enrich_store=None):
+    """今回の取得分をストアに統合
+
+    既存の id は MERGE_RULES で更新して最終取得日を進め、未知の id は取得順に seq を振って追加する
+    （公開時は seq の降順なので、取得順の逆順で先頭に並ぶ）。enrich_store は補完の記録（enriched の規則で使う）。
+    """
+    enrich_store = enrich_store or {}
+    today = str(date.today())
+    known = fetch_rows(db, [item["id"] for item in new_items])
+    next_seq = (db.execute("SELECT MAX(seq) FROM items").fetchone()[0] or 0) + 1
+    rows = []
+    for item in new_items:
+        if item["id"] in known:
+            ex, seq, first_seen, _ = known[item["id"]]
+            merge_record(ex, item, enrich_store.get(item["id"]))
+            rows.append(item_row(ex, seq, first_seen, today))
+        else:
+            rows.append(item_row(item, next_seq, item.get("date", today), today))
+            next_seq += 1
+    write_items(db, rows)
+    return len(new_items) - len(known)
+
+def normalize_prefs(db):
+    """都道府県が「全国」のアイテムをタイトル・機関名から都道府県に振り直す"""
+    rows = []
+    for item, seq, first_seen, last_seen in query_rows(db, "pref = ?", ("全国",)):
+        title = item.get("title","") + item.get("org","")
+        for kanto in KANTO_PREFS:
+            if kanto in title:
+                item["pref"] = kanto
+                item["source"] = "自治体"
+                break
+        else:
+            for pref in ALL_PREFS:
+                if pref in title:
+                    item["pref"] = pref
                     item["source"] = "自治体"
                     break
-            else:
-                for pref in ALL_PREFS:
-                    if pref in title:
-                        item["pref"] = pref
-                        item["source"] = "自治体"
-                        break
-
-    existing_ids = {item["id"] for item in existing}
-    for item in all_new_items:
-        if item["id"] not in existing_ids:
-            existing.insert(0, item)
-            existing_ids.add(item["id"])
+        rows.append(item_row(item, seq, first_seen, last_seen))
+    write_items(db, rows, _UPSERT_EDIT)
+
+def update_expiry(db):
+    """経過フラグと status をストア全体に対して SQL の UPDATE 2本で更新する
+
+    期限がなく開始日から EXPIRY_DAYS 経過したものに expired_by_age を立て、
+    expired_by_age か expires_on を過ぎたものを expired、それ以外を active にする（data の JSON も同時に書き換える）。
+    """
+    today = str(date.today())
+    threshold = str(date.today() - timedelta(days=EXPIRY_DAYS))
+    status = "CASE WHEN expired_by_age OR (expires_on != '' AND expires_on <= :today) THEN 'expired' ELSE 'active' END"
+    with db:
+        aged = db.execute(
+            "UPDATE items SET expired_by_age = 1, data = json_set(data, '$.expired_by_age', json('true')) "
+            "WHERE expired_by_age = 0 AND deadline = '' AND start_date != '' AND start_date <= :threshold",
+            {"threshold": threshold}).rowcount
+        changed = db.execute(
+            f"UPDATE items SET status = {status}, data = json_set(data, '$.status', {status}) "
+            f"WHERE status != {status}",
+            {"today": today}).rowcount
+    return aged, changed
+
+def prune_items(db):
+    """ITEM_RETENTION_DAYS より前から取得されていないアイテムを削除"""
+    cutoff = str(date.today() - timedelta(days=ITEM_RETENTION_DAYS))
+    with db:
+        return db.execute("DELETE FROM items WHERE last_seen < ?", (cutoff,)).rowcount
+
+def published_fingerprints(db):
+    """公開期間内のアイテムの (id, 都道府県, 指紋) を古い順に"""
+    cutoff = str(date.today() - timedelta(days=PUBLISH_DAYS))
+    return db.execute("SELECT id, pref, fingerprint FROM items WHERE date >= ? ORDER BY seq", (cutoff,)).fetchall()
+
+def drop_duplicates(db, items):
+    """items から、公開期間内のアイテムか items の先のものと同じ告知とみなせるものを除く（個別取得を省く）"""
+    entries = published_fingerprints(db)
+    stored = {row[0] for row in entries}
+    entries += [(item["id"], item.get("pref", ""), title_fingerprint(item.get("title", "")))
+                for item in items if item["id"] not in stored]
+    dups = find_duplicates(entries)
+    return [item for item in items if item["id"] not in dups]
+
+# 個別取得の対象になるストアのアイテム（公開期間内で重複でなく期限が未取得のもの。jGrants は個別取得しない）
+_NO_DEADLINE = ("date >= :cutoff AND duplicate_of = '' AND deadline = '' "
+                "AND json_extract(data, '$.url') NOT LIKE '%jgrants-portal%'")
+# 個別取得を待っているもの（query_rows の条件）。補完の記録がないか、期限を取得済みの記録があるか、再取得の時期が来ているもの
+_PENDING_ENRICHMENT = _NO_DEADLINE + " AND id NOT IN (SELECT id FROM enrichment WHERE deadline = '' AND next_try > :today)"
+# 積み残し（enrich_backlog）。補完の記録がないか、期限が取れず再取得の時期が来ているもの
+_ENRICH_BACKLOG = _NO_DEADLINE + " AND id NOT IN (SELECT id FROM enrichment WHERE deadline != '' OR next_try > :today)"
+
+def enrichment_params():
+    return {"cutoff": str(date.today() - timedelta(days=PUBLISH_DAYS)), "today": str(date.today())}
+
+def pending_enrichment(db):
+    """個別取得を待っているストアのアイテムの (item, seq, first_seen, last_seen) のリスト
+
+    今回の一覧に載らなかったもの（差分取得で読まなかったページ、フィードの取得済みのエントリ、
+    前回の上限・時間切れで届かなかったもの）も、ここから個別取得の候補に戻す。
+    """
+    return query_rows(db, _PENDING_ENRICHMENT, enrichment_params())
+
+def enrich_backlog(db):
+    """個別取得の積み残しの {機関: 件数}（件数の多い順）
+
+    今回の上限・時間切れで届かなかったものに加え、今回の一覧に載らなかったストアのアイテムも含む
+    （再取得待ちのものは含まない）。統合と重複の判定を終えたストアから数える。
+    """
+    rows = db.execute(f"SELECT json_extract(data, '$.org'), COUNT(*) FROM items WHERE {_ENRICH_BACKLOG} "
+                      "GROUP BY 1 ORDER BY 2 DESC, 1", enrichment_params()).fetchall()
+    return {org or "": n for org, n in rows}
+
+def store_enrichment(db, items, enrich_store):
+    """ストアから候補にしたアイテムの補完結果を MERGE_RULES で反映し、変わった件数を返す（最終取得日は進めない）"""
+    rows = []
+    by_id = {item["id"]: item for item in items}
+    for id_, (ex, seq, first_seen, last_seen) in fetch_rows(db, by_id).items():
+        before = dict(ex)
+        merge_record(ex, by_id[id_], enrich_store.get(id_))
+        if ex != before:
+            rows.append(item_row(ex, seq, first_seen, last_seen))
+    write_items(db, rows, _UPSERT_EDIT)
+    return len(rows)
+
+def mark_duplicates(db):
+    """公開期間内のアイテムの duplicate_of を付け直し、重複とみなした件数を返す
+
+    先に載った（seq の小さい）方を残すので、一度公開したアイテムが後から来た同じ告知に置き換わることはない。
+    """
+    dups = find_duplicates(published_fingerprints(db))
+    cutoff = str(date.today() - timedelta(days=PUBLISH_DAYS))
+    current = dict(db.execute("SELECT id, duplicate_of FROM items WHERE date >= ?", (cutoff,)))
+    updates = [(dups.get(id_, ""), id_) for id_, dup in current.items() if dups.get(id_, "") != dup]
+    with db:
+        db.executemany("UPDATE items SET duplicate_of = ? WHERE id = ?", updates)
+    return len(dups)
+
+def iter_published(db, pref=None):
+    """公開対象（取得日が PUBLISH_DAYS 以内で、重複でないもの）を 1都3県 → その他、それぞれ新しい順に1件ずつ返す
+
+    並べ替えと期間の絞り込みは SQL 側で行い、ここではカーソルから読んだ行をそのまま流す。
+    pref を指定するとその都道府県だけを返し、各アイテムに seq を付ける（シャード用）。
+    """
+    cutoff = str(date.today() - timedelta(days=PUBLISH_DAYS))
+    if pref is not None:
+        rows = db.execute("SELECT data, seq FROM items WHERE date >= ? AND pref = ? AND duplicate_of = '' "
+                          "ORDER BY seq DESC",
+                          (cutoff, pref))
+        for data, seq in rows:
+            yield dict(json.loads(data), seq=seq)
+        return
+    marks = ", ".join("?" * len(KANTO_PREFS))
+    sql = (f"SELECT data FROM items WHERE date >= ? AND duplicate_of = '' "
+           f"ORDER BY pref IN ({marks}) DESC, seq DESC")
+    for (data,) in db.execute(sql, (cutoff, *KANTO_PREFS)):
+        yield json.loads(data)
+
+def count_published(db):
+    """公開対象の (件数, うち 1都3県 の件数)"""
+    cutoff = str(date.today() - timedelta(days=PUBLISH_DAYS))
+    marks = ", ".join("?" * len(KANTO_PREFS))
+    return db.execute(f"SELECT COUNT(*), COALESCE(SUM(pref IN ({marks})), 0) FROM items "
+                      "WHERE date >= ? AND duplicate_of = ''", (*KANTO_PREFS, cutoff)).fetchone()
+
+# 公開ファイルの読み書き。書き込みは同じディレクトリの一時ファイルに書いてから os.replace で置き換えるので、
+# 途中でジョブが止められても書きかけのファイルが公開されることはない
+@contextmanager
+def atomic_open(path, mode="w"):
+    """path への書き込みを一時ファイル経由で行い、with を抜けたときに置き換える"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with open(fd, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            yield f
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+def iter_history_items(path, chunk_size=1 << 16):
+    """data.json の items を先頭から1件ずつ読む（ファイル全体を読み込まない）"""
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buf = ""
+        while True:
+            m = re.search(r'"items"\s*:\s*\[', buf)
+            if m:
+                pos = m.end()
+                break
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            buf = buf[-32:] + chunk
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf) or buf[pos] == "{":
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    # 読み込んだ範囲で途切れている。続きを足して読み直す
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        if pos >= len(buf):
+                            raise ValueError("items が閉じられていません")
+                        raise
+                    buf, pos = buf[pos:] + chunk, 0
+                    continue
+                yield item
+                pos = end
+                if pos > chunk_size:
+                    buf, pos = buf[pos:], 0
+                continue
+            if buf[pos] == "]":
+                return
+            raise ValueError(f"items の要素がオブジェクトではありません: {buf[pos:pos + 20]!r}")
+
+def write_history(path, header, items):
+    """json.dump(..., ensure_ascii=False, indent=2) と同じ形で data.json を1件ずつ書く
+
+    header（updated・count・total）を先に書き、items は渡されたイテレータを流しながら書き出す。
+    """
+    with atomic_open(path) as f:
+        f.write("{\n")
+        for key, value in header.items():
+            f.write(f"  {json.dumps(key, ensure_ascii=False)}: {json.dumps(value, ensure_ascii=False)},\n")
+        f.write('  "items": [')
+        empty = True
+        for item in items:
+            f.write("\n    " if empty else ",\n    ")
+            f.write(json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n    "))
+            empty = False
+        f.write("]\n}" if empty else "\n  ]\n}")
+
+_REIWA_DEADLINE_RE = re.compile(r'令和(\d+)年(\d+)月(\d+)日')
+_ISO_DEADLINE_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+def deadline_to_date(deadline):
+    """申請期限の文字列（「令和8年5月1日締切」か YYYY-MM-DD を含むもの）を date に"""
+    m = _REIWA_DEADLINE_RE.search(deadline) or _ISO_DEADLINE_RE.search(deadline)
+    if not m:
+        return None
+    year = int(m.group(1)) + (2018 if m.re is _REIWA_DEADLINE_RE else 0)
+    try:
+        return date(year, int(m.group(2)), int(m.group(3)))
+    except ValueError:
+        return None
+
+def set_item_status(item, today=None):
+    """deadline_date（申請期限の ISO 日付）・expires_on（期限切れになる日）・status を付ける
+
+    期限切れになるのは申請期限の翌日か、開始日から EXPIRY_DAYS 後の早いほう。
+    ダッシュボードは status と expires_on を今日の日付と比べるだけで判定する。
+    """
+    today = today or date.today()
+    deadline = deadline_to_date(item.get("deadline", ""))
+    candidates = [deadline + timedelta(days=1)] if deadline else []
+    if item.get("start_date"):
+        try:
+            candidates.append(date.fromisoformat(item["start_date"]) + timedelta(days=EXPIRY_DAYS))
+        except ValueError:
+            pass
+    expires_on = min(candidates) if candidates else None
+    item["deadline_date"] = str(deadline) if deadline else ""
+    item["expires_on"] = str(expires_on) if expires_on else ""
+    expired = item.get("expired_by_age") or (expires_on is not None and expires_on <= today)
+    item["status"] = "expired" if expired else "active"
+    return item
+
+def is_expired_item(item, today=None):
+    """status が expired か、expires_on を過ぎているか（ダッシュボードの isExpired と同じ判定）"""
+    today = str(today or date.today())
+    return item.get("status") == "expired" or bool(item.get("expires_on")) and item["expires_on"] <= today
+
+def pref_code(pref):
+    """シャードのファイル名に使う都道府県コード（JIS X 0401）。全国は 00、不明は 99"""
+    if pref in ALL_PREFS:
+        return f"{ALL_PREFS.index(pref) + 1:02d}"
+    return "00" if pref in ("", "全国") else "99"
+
+def new_stats():
+    """manifest に載せるファセット件数と当日の件数"""
+    return {
+        "facets": {"category": {}, "pref": {}, "source": {}, "status": {"active": 0, "expired": 0}},
+        "today": {"date": str(date.today()), "count": 0, "local": 0},
+        "fields": [],
+    }
+
+def tally(items, stats):
+    """items をそのまま流しながら stats を数える
+
+    ファセット（カテゴリ・都道府県・情報ソース）は有効なものだけ、status は有効/期限切れの両方。
+    fields には空でない値を持つフィールドを初出順に集める（コンパクト形式の列になる）。
+    """
+    facets, today, fields = stats["facets"], stats["today"], stats["fields"]
+    for item in items:
+        for key, value in item.items():
+            if value and key not in fields:
+                fields.append(key)
+        if item.get("date") == today["date"]:
+            today["count"] += 1
+            today["local"] += item.get("source") == "自治体"
+        if is_expired_item(item):
+            facets["status"]["expired"] += 1
         else:
-            # 既存アイテムの期限・開始日を更新（新たに取得できた場合）
-            for ex in existing:
-                if ex["id"] == item["id"]:
-                    if item.get("deadline") and not ex.get("deadline"):
-                        ex["deadline"] = item["deadline"]
-                    if item.get("start_date") and not ex.get("start_date"):
-                        ex["start_date"] = item["start_date"]
-                    if item.get("expired_by_age"):
-                        ex["expired_by_age"] = True
-                    break
+            facets["status"]["active"] += 1
+            for cat in item.get("categories") or [item.get("category")]:
+                facets["category"][cat] = facets["category"].get(cat, 0) + 1
+            for key in ("pref", "source"):
+                facets[key][item.get(key)] = facets[key].get(item.get(key), 0) + 1
+        yield item
 
-    # 既存アイテムのうち start_date があるものに expired_by_age を付与
-    for item in existing:
-        if item.get("start_date") and not item.get("deadline") and not item.get("expired_by_age"):
-            try:
-                sd = date.fromisoformat(item["start_date"])
-                if is_expired_by_start_date(sd):
-                    item["expired_by_age"] = True
-            except:
-                pass
-
-    cutoff = str(date.today() - timedelta(days=90))
-    combined = [r for r in existing if r.get("date","") >= cutoff]
-
-    kanto = [x for x in combined if x.get("pref") in KANTO_PREFS]
-    others = [x for x in combined if x.get("pref") not in KANTO_PREFS]
-    combined = kanto + others
-
-    logger.info(f"1都3県: {len(kanto)}件 / 全{len(combined)}件")
-
-    Path("docs").mkdir(exist_ok=True)
-    output = {
-        "updated": datetime.now().strftime("%Y年%m月%d日 %H:%M"),
-        "count": len(all_new_items),
-        "total": len(combined),
-        "items": combined,
+# ダッシュボードの全文検索用の転置索引。日本語は分かち書きせずに文字 2-gram で引き、
+# 語（空白区切り）ごとの 2-gram の投稿リスト（seq の昇順）の共通部分を候補にする。
+# 投稿リストは先頭の seq と、そこからの差分の列で持つ。SEARCH_COMMON_RATIO を超えてよく出る 2-gram は
+# common に名前だけ載せ、ダッシュボードは絞り込みに使わない（語を含むかは候補の文字列で確かめる）
+_SEARCH_SPLIT_RE = re.compile(r"\s+")
+
+def search_grams(text):
+    """NFKC と小文字にそろえた text の、語ごとの 2-gram の集合（1文字の語はその1文字）"""
+    grams = set()
+    for word in _SEARCH_SPLIT_RE.split(unicodedata.normalize("NFKC", text).lower()):
+        if len(word) == 1:
+            grams.add(word)
+        grams.update(word[i:i + 2] for i in range(len(word) - 1))
+    return grams
+
+def add_to_search_index(postings, item):
+    """item の SEARCH_FIELDS の 2-gram ごとに seq を投稿リストへ足す"""
+    grams = set()
+    for field in SEARCH_FIELDS:
+        grams |= search_grams(item.get(field) or "")
+    for gram in grams:
+        postings.setdefault(gram, []).append(item["seq"])
+
+def encode_search_index(postings, docs):
+    """{2-gram: seq のリスト} を seq の昇順・差分の列にした索引の JSON（キーの順に並べるので内容が同じなら同じ文字列）
+
+    common_ratio（SEARCH_COMMON_RATIO）も載せ、ダッシュボードは1文字の語を絞り込みに使うかの判断にこれを使う。
+    """
+    encoded, common = {}, []
+    for gram in sorted(postings):
+        seqs = sorted(postings[gram])
+        if len(seqs) > docs * SEARCH_COMMON_RATIO:
+            common.append(gram)
+            continue
+        encoded[gram] = [seqs[0]] + [b - a for a, b in zip(seqs, seqs[1:])]
+    return json.dumps({"fields": SEARCH_FIELDS, "docs": docs, "common_ratio": SEARCH_COMMON_RATIO,
+                       "common": common, "postings": encoded},
+                      ensure_ascii=False, separators=(",", ":"))
+
+def write_shards(db, header, stats):
+    """公開アイテムを都道府県別のシャードと manifest.json に書き出す
+
+    シャードは内容ハッシュ入りのファイル名にして、ブラウザが恒久的にキャッシュできるようにする。
+    1件ずつ一時ファイルに書きながらハッシュを取り、書き終えてからその名前に置き換える。
+    manifest のファセット件数（stats）はダッシュボードがフィルターの描画に使い、1都3県 のシャードを先に読み込む。
+    同じ走査で検索索引も作り、内容ハッシュ入りの search.*.json として manifest の search に載せる。
+    前の manifest が指すファイルは残す（公開の直前に前の manifest を読んだブラウザがシャードを取りに来ても 404 にしない）。
+    どちらの manifest も指さないファイルだけを、新しい manifest を書いてから消す。
+    """
+    previous = manifest_files(SHARD_DIR / "manifest.json")
+    cutoff = str(date.today() - timedelta(days=PUBLISH_DAYS))
+    prefs = [row[0] for row in db.execute("SELECT DISTINCT pref FROM items WHERE date >= ? AND duplicate_of = ''",
+                                                (cutoff,))]
+    prefs.sort(key=lambda pref: (pref not in KANTO_PREFS, pref_code(pref)))
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    entries = []
+    postings = {}
+    docs = 0
+    for pref in prefs:
+        digest = hashlib.sha1()
+        count = 0
+        with atomic_open(SHARD_DIR / f"pref-{pref_code(pref)}.tmp.json", "wb") as f:
+            def put(text):
+                data = text.encode("utf-8")
+                digest.update(data)
+                f.write(data)
+            put('{"items":[')
+            for item in iter_published(db, pref):
+                put(("," if count else "") + json.dumps(item, ensure_ascii=False, separators=(",", ":")))
+                add_to_search_index(postings, item)
+                count += 1
+            put("]}")
+        name = f"pref-{pref_code(pref)}.{digest.hexdigest()[:12]}.json"
+        os.replace(SHARD_DIR / f"pref-{pref_code(pref)}.tmp.json", SHARD_DIR / name)
+        entries.append({"pref": pref, "file": f"{SHARD_DIR.name}/{name}", "count": count,
+                        "kanto": pref in KANTO_PREFS})
+        docs += count
+
+    index = encode_search_index(postings, docs).encode("utf-8")
+    search_name = f"search.{hashlib.sha1(index).hexdigest()[:12]}.json"
+    with atomic_open(SHARD_DIR / search_name, "wb") as f:
+        f.write(index)
+    search = {"file": f"{SHARD_DIR.name}/{search_name}", "docs": docs, "grams": len(postings), "bytes": len(index)}
+
+    manifest = dict(header, today=stats["today"], facets=stats["facets"], shards=entries, search=search)
+    with atomic_open(SHARD_DIR / "manifest.json") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    keep = previous | {Path(e["file"]).name for e in entries} | {search_name}
+    for path in [*SHARD_DIR.glob("pref-*.json"), *SHARD_DIR.glob("search.*.json")]:
+        if path.name not in keep:
+            path.unlink()
+    return manifest
+
+def manifest_files(path):
+    """manifest.json が指すシャードと検索索引のファイル名（manifest がなければ空）"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return set()
+    files = [entry["file"] for entry in manifest.get("shards", [])]
+    if manifest.get("search"):
+        files.append(manifest["search"]["file"])
+    return {Path(file).name for file in files}
+
+def seed_published(db):
+    """前回公開分の記録がまだなければ、今の data.json を基準として取り込む"""
+    if db.execute("SELECT 1 FROM published LIMIT 1").fetchone() or not HISTORY_FILE.exists():
+        return
+    rows = []
+    try:
+        with db:
+            for item in iter_history_items(HISTORY_FILE):
+                rows.append((item["id"], json.dumps(item, ensure_ascii=False)))
+                if len(rows) >= DB_BATCH:
+                    db.executemany("INSERT OR IGNORE INTO published VALUES (?, ?)", rows)
+                    rows = []
+            db.executemany("INSERT OR IGNORE INTO published VALUES (?, ?)", rows)
+    except ValueError as e:
+        logger.warning(f"data.json を差分の基準にできません: {e}")
+
+def save_published(db):
+    """今回の公開対象を次回の差分の基準として記録"""
+    cutoff = str(date.today() - timedelta(days=PUBLISH_DAYS))
+    with db:
+        db.execute("DELETE FROM published")
+        db.execute("INSERT INTO published SELECT id, data FROM items WHERE date >= ? AND duplicate_of = ''",
+                   (cutoff,))
+
+def diff_published(db):
+    """前回公開分との差分 {added: [item], changed: [{id, fields, removed}], dropped: [id]}
+
+    changed の fields は値が変わった（または増えた）フィールドの新しい値、removed は無くなったフィールド。
+    比較は id で結合した SQL で行い、JSON の文字列が異なる行だけを読み出して比べる。
+    """
+    seed_published(db)
+    cutoff = str(date.today() - timedelta(days=PUBLISH_DAYS))
+    marks = ", ".join("?" * len(KANTO_PREFS))
+    added = [json.loads(row[0]) for row in db.execute(
+        "SELECT i.data FROM items i LEFT JOIN published p ON p.id = i.id "
+        f"WHERE i.date >= ? AND i.duplicate_of = '' AND p.id IS NULL "
+        f"ORDER BY i.pref IN ({marks}) DESC, i.seq DESC",
+        (cutoff, *KANTO_PREFS))]
+    changed = []
+    for id_, new, old in db.execute(
+            "SELECT i.id, i.data, p.data FROM items i JOIN published p ON p.id = i.id "
+            f"WHERE i.date >= ? AND i.duplicate_of = '' AND i.data != p.data "
+            f"ORDER BY i.pref IN ({marks}) DESC, i.seq DESC",
+            (cutoff, *KANTO_PREFS)):
+        item, old = json.loads(new), json.loads(old)
+        fields = {k: v for k, v in item.items() if old.get(k) != v}
+        removed = [k for k in old if k not in item]
+        if fields or removed:
+            entry = {"id": id_, "fields": fields}
+            if removed:
+                entry["removed"] = removed
+            changed.append(entry)
+    dropped = [row[0] for row in db.execute(
+        "SELECT p.id FROM published p "
+        "LEFT JOIN items i ON i.id = p.id AND i.date >= ? AND i.duplicate_of = '' "
+        "WHERE i.id IS NULL ORDER BY p.rowid", (cutoff,))]
+    return {"added": added, "changed": changed, "dropped": dropped}
+
+def write_delta(delta, updated):
+    """差分を deltas/<版>.json に書き、index.json の先頭に足す。DELTA_KEEP 件より古い差分は消す
+
+    クライアントは index.json を見て、手元の版より新しい差分を古い順に当てれば最新に追いつける。
+    手元の版が一覧に無ければ data.json を取り直す。
+    """
+    DELTA_DIR.mkdir(parents=True, exist_ok=True)
+    index_path = DELTA_DIR / "index.json"
+    index = {"latest": None, "deltas": []}
+    if index_path.exists():
+        with open(index_path, encoding="utf-8") as f:
+            try: index = json.load(f)
+            except: pass
+    version = datetime.now().strftime("%Y%m%d%H%M%S")
+    name = f"{version}.json"
+    doc = dict({"version": version, "previous": index["latest"], "updated": updated}, **delta)
+    with atomic_open(DELTA_DIR / name) as f:
+        json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+    entry = {"version": version, "previous": index["latest"], "file": f"{DELTA_DIR.name}/{name}",
+             "added": len(delta["added"]), "changed": len(delta["changed"]), "dropped": len(delta["dropped"])}
+    index = {"latest": version, "deltas": [entry] + index["deltas"][:DELTA_KEEP - 1]}
+    with atomic_open(index_path) as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    keep = {Path(e["file"]).name for e in index["deltas"]} | {index_path.name}
+    for path in DELTA_DIR.glob("*.json"):
+        if path.name not in keep:
+            path.unlink()
+    return version
+
+def set_github_output(**values):
+    """GitHub Actions のステップ出力に書く（Actions の外では何もしない）"""
+    path = os.environ.get("GITHUB_OUTPUT")
+    if not path:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for key, value in values.items():
+            f.write(f"{key}={value}\n")
+
+def write_run_report(db, report):
+    """今回の計測をストアの runs に足し、最新の全体と直近 RUN_REPORT_KEEP 回の概要を run_report.json に書く
+
+    runs はストアに残すので、公開データに変更がなく run_report.json をコミットしない実行も次回の history に載る。
+    """
+    with db:
+        db.execute("INSERT OR REPLACE INTO runs (started, report) VALUES (?, ?)",
+                   (report["started"], json.dumps(report, ensure_ascii=False)))
+        db.execute("DELETE FROM runs WHERE started NOT IN "
+                   "(SELECT started FROM runs ORDER BY started DESC LIMIT ?)", (RUN_REPORT_KEEP,))
+    history = []
+    for (row,) in db.execute("SELECT report FROM runs ORDER BY started DESC"):
+        run = json.loads(row)
+        history.append({k: v for k, v in run.items() if k not in ("sources", "hosts")})
+    with atomic_open(RUN_REPORT_FILE) as f:
+        json.dump({"latest": report, "history": history}, f, ensure_ascii=False, indent=2)
+
+def write_compact(header, items, fields, path=COMPACT_FILE):
+    """data.json と同じ内容を列指向・最小化した JSON と、その .gz（brotli があれば .br も）を書く
+
+    items は fields（空でない値を持つフィールド）の順の列（columns）に分け、空の値（""・false・空リスト・キーなし）は
+    null にする。COMPACT_INTERNED のフィールドは strings の表の番号で持つ。expand_compact で items に戻せる。
+    items は1回だけ流し、列ごとの一時ファイルに書いてから最後につなげる。書いたファイルの {パス: バイト数} を返す。
+    """
+    interned = {key: {} for key in COMPACT_INTERNED if key in fields}
+    with tempfile.TemporaryDirectory(dir=path.parent) as tmp:
+        columns = {key: open(Path(tmp) / f"{i}.col", "w+", encoding="utf-8") for i, key in enumerate(fields)}
+        try:
+            for n, item in enumerate(items):
+                for key, col in columns.items():
+                    value = item.get(key) or None
+                    if value is not None and key in interned:
+                        value = interned[key].setdefault(value, len(interned[key]))
+                    col.write(("," if n else "") + json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+            with atomic_open(path) as f:
+                f.write(json.dumps({"format": "columnar-1", **header, "fields": fields},
+                                   ensure_ascii=False, separators=(",", ":"))[:-1])
+                f.write(',"columns":{')
+                for i, (key, col) in enumerate(columns.items()):
+                    f.write(("," if i else "") + json.dumps(key, ensure_ascii=False) + ":[")
+                    col.seek(0)
+                    while chunk := col.read(1 << 16):
+                        f.write(chunk)
+                    f.write("]")
+                strings = {key: list(table) for key, table in interned.items()}
+                f.write('},"strings":' + json.dumps(strings, ensure_ascii=False, separators=(",", ":")) + "}")
+        finally:
+            for col in columns.values():
+                col.close()
+
+    gz_path = path.with_name(path.name + ".gz")
+    br_path = path.with_name(path.name + ".br")
+    with open(path, "rb") as src, atomic_open(gz_path, "wb") as dst:
+        with gzip.GzipFile(filename="", mode="wb", compresslevel=9, fileobj=dst, mtime=0) as gz:
+            while chunk := src.read(1 << 16):
+                gz.write(chunk)
+    written = [path, gz_path]
+    if brotli is not None:
+        compressor = brotli.Compressor(quality=11)
+        with open(path, "rb") as src, atomic_open(br_path, "wb") as dst:
+            while chunk := src.read(1 << 16):
+                dst.write(compressor.process(chunk))
+            dst.write(compressor.finish())
+        written.append(br_path)
+    else:
+        logger.info("brotli が無いため .br は書きません")
+    return {p: p.stat().st_size for p in written}
+
+def expand_compact(doc):
+    """write_compact で書いた JSON の逆変換。items のリストを返す（空のフィールドはキーごと無くなる）"""
+    strings = doc["strings"]
+    columns = [(key, doc["columns"][key], strings.get(key)) for key in doc["fields"]]
+    items = []
+    for i in range(doc["total"]):
+        item = {}
+        for key, column, table in columns:
+            value = column[i]
+            if value is not None:
+                item[key] = table[value] if table is not None else value
+        items.append(item)
+    return items
+
+def parse_time_budget(value):
+    """--time-budget の秒数。公開のために残す TIME_BUDGET_RESERVE 秒以下では何も取得できないので受け付けない"""
+    try:
+        seconds = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"秒数で指定してください: {value}")
+    if seconds <= TIME_BUDGET_RESERVE:
+        raise argparse.ArgumentTypeError(
+            f"統合と公開に{TIME_BUDGET_RESERVE}秒を残すので、{TIME_BUDGET_RESERVE}秒より長く指定してください: {value}")
+    return seconds
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="補助金情報を収集して docs/ に公開用データを書き出す")
+    parser.add_argument("--compact", action="store_true",
+                        help=f"{COMPACT_FILE}（列指向・最小化）と .gz / .br も書き出す")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="DIR",
+                      help="取得したレスポンスをすべて DIR に記録する（HTTP キャッシュは使わない）")
+    mode.add_argument("--replay", metavar="DIR",
+                      help="ネットワークに出ず、--record で記録した DIR のレスポンスで実行する")
+    shard = parser.add_mutually_exclusive_group()
+    shard.add_argument("--shard", type=parse_shard, metavar="i/N",
+                       help="取得元を URL のハッシュで N 分割した i 番目だけを取得し、部分結果を書いて終わる")
+    shard.add_argument("--reduce", action="store_true",
+                       help="取得の代わりに --shard の部分結果を読み、補完・統合・公開する")
+    parser.add_argument("--partial-dir", default=str(PARTIAL_DIR), metavar="DIR",
+                        help=f"部分結果のディレクトリ（既定 {PARTIAL_DIR}）")
+    parser.add_argument("--full", action="store_true",
+                        help=f"ページ送りのある取得元も差分取得せず全ページを取得する（既定は {FULL_RESYNC_DAYS} 日ごと）")
+    parser.add_argument("--parser", choices=["lxml", "bs4"], default=PARSER_BACKEND,
+                        help=f"HTML の解析方法（既定 {PARSER_BACKEND}。bs4 は比較用で結果は同じ）")
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS, metavar="N",
+                        help=f"HTML の解析・抽出を N 個のプロセスで行う（既定 {PARSE_WORKERS}: 取得スレッドで解析）")
+    parser.add_argument("--time-budget", type=parse_time_budget, metavar="SECONDS",
+                        help=f"この秒数で終わるように、残り{TIME_BUDGET_RESERVE}秒を切ったら新しい取得をやめて"
+                             "取得済みの分で公開する（残りの取得元は次回チェックポイントから再開）")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="cProfile の統計を FILE に書き、累積時間の上位をログに出す（並列処理の分も含む。"
+                             "Python 3.12 以降は1つの cProfile で全スレッドを拾うので、スレッドをまたぐ呼び出しの"
+                             "時間は目安）")
+    return parser.parse_args(argv)
+
+def profile_run(args):
+    """run を cProfile で計測する。run_parallel のワーカーの分も合算して FILE に書く
+
+    3.11 まではワーカーごとの cProfile を合算し、3.12 以降はメインスレッドの1つで全スレッドを計測する
+    （PROFILE_PER_THREAD）。FILE は python -m pstats や snakeviz で開ける。
+    """
+    global _thread_profilers
+    _thread_profilers = [] if PROFILE_PER_THREAD else None
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(run, args)
+    finally:
+        stats = pstats.Stats(profiler, *(_thread_profilers or []), stream=io.StringIO())
+        _thread_profilers = None
+        path = Path(args.profile)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(path)
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+        logger.info(f"=== プロファイル（{path}）===\n{stats.stream.getvalue()}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile:
+        profile_run(args)
+    else:
+        run(args)
+
+def run_shard(args):
+    """--shard i/N: 分担の取得元だけを取得して部分結果を書く（補完・統合・公開は --reduce で行う）"""
+    index, count = args.shard
+    sources = [source for source in SOURCES if shard_of(source, count) == index]
+    logger.info(f"=== 分担 {index}/{count}: 取得元{len(sources)}件 ===")
+    start_parse_pool(args.parse_workers)
+    with stage("scrape"):
+        results = fetch_sources(sources)
+    stop_parse_pool()
+    path = write_partial(args.partial_dir, index, count, sources, results)
+    found = sum(len(items) for pages, _ in results for items in pages)
+    logger.info(f"部分結果: {path}（{found}件）")
+    logger.info("=== 通信統計 ===")
+    log_http_stats()
+    logger.info("=== 段階別 ===")
+    log_stage_stats()
+    prune_http_cache()
+
+def run(args):
+    """収集から公開までの1回分"""
+    global HTTP_CACHE_DIR, PARSER_BACKEND, _record_dir, _replay_adapter, _deadline
+    started_at = datetime.now()
+    started = time.monotonic()
+    PARSER_BACKEND = args.parser
+    if args.time_budget is not None:
+        _deadline = started + args.time_budget - TIME_BUDGET_RESERVE
+    if args.record:
+        _record_dir = Path(args.record)
+        HTTP_CACHE_DIR = None
+        logger.info(f"記録モード: {_record_dir}")
+    if args.replay:
+        _replay_adapter = ReplayAdapter(args.replay)
+        logger.info(f"再生モード: {args.replay}")
+
+    if args.shard:
+        run_shard(args)
+        return
+
+    # 各ソースを並列に取得（ホストごとの間隔・同時接続数は polite_get が制御）
+    logger.info("=== 1都3県 公式サイト・東京都ポータル・神奈川県（タグ検索＋健康医療局）・省庁と道府県のフィード ===")
+    db = open_db()
+    removed = rollback_interrupted(db)
+    if removed:
+        logger.info(f"中断した前回の実行が追加した{removed}件を取り消し（今回取得し直して追加する）")
+    start_parse_pool(args.parse_workers)
+    shards = None
+    with stage("scrape"):
+        if args.reduce:
+            results, shards = load_partials(args.partial_dir, SOURCES)
+        else:
+            results = fetch_sources(SOURCES, db, full=args.full)
+        all_new_items = combine_sources(SOURCES, results)
+    complete = all(st["complete"] for st in SOURCE_STATS)
+    if not complete:
+        skipped = sum(1 for st in SOURCE_STATS if not st["complete"])
+        logger.warning(f"未完了の取得元 {skipped}件（時間切れ・部分結果なし）: 取得済みの分で公開します")
+
+    # 期限未取得のアイテムを個別ページから補完（開始日も取得。自治体を優先する: SOURCE_PRIORITY）
+    logger.info("=== 期限・開始日情報を個別ページから補完 ===")
+    with stage("enrich"):
+        unique_new = drop_duplicates(db, all_new_items)
+        if len(unique_new) < len(all_new_items):
+            logger.info(f"同じ告知とみなして個別取得を省略: {len(all_new_items) - len(unique_new)}件")
+        first_seen = {id_: row[2] for id_, row in fetch_rows(db, [i["id"] for i in unique_new]).items()}
+        # 今回の一覧に載らなかった、ストアで期限が未取得のままのアイテムも候補にする
+        scraped = {item["id"] for item in all_new_items}
+        stored = []
+        for item, _, seen, _ in pending_enrichment(db):
+            if item["id"] not in scraped:
+                stored.append(item)
+                first_seen[item["id"]] = seen
+        if stored:
+            logger.info(f"ストアの期限未取得（今回の一覧に無いもの）: {len(stored)}件を候補に追加")
+        enrich_store = load_enrich_store(db)
+        enrich_items(unique_new + stored, max_fetch=60, store=enrich_store, first_seen=first_seen,
+                     checkpoint=lambda ids: save_enrich_records(db, enrich_store, ids))
+        save_enrich_store(db, enrich_store)
+        if stored:
+            logger.info(f"ストアのアイテムに補完結果を反映: {store_enrichment(db, stored, enrich_store)}件")
+    stop_parse_pool()
+
+    logger.info(f"新規スクレイピング合計: {len(all_new_items)}件")
+
+    with stage("store"):
+        normalize_prefs(db)
+        count_new_by_source(db)
+        last_seq = db.execute("SELECT COALESCE(MAX(seq), 0) FROM items").fetchone()[0]
+        added = store_items(db, all_new_items, enrich_store)
+        if complete:
+            clear_checkpoint(db)
+        elif not args.reduce:
+            # --reduce はチェックポイントを書かないので、取り消しても次の実行で取得し直せない。欠けた分担の取得元は
+            # load_partials で未完了にしてあり、統合した分はそのまま残す
+            save_interrupted(db, last_seq)
+        aged, changed = update_expiry(db)
+        pruned = prune_items(db)
+        duplicates = mark_duplicates(db)
+        stored = db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        logger.info(f"ストア: 新規{added}件・経過判定{aged}件・状態変更{changed}件・削除{pruned}件 → {stored}件"
+                    f"（うち公開期間内の重複{duplicates}件）")
+        backlog = enrich_backlog(db)
+        logger.info(f"個別取得の積み残し: {sum(backlog.values())}件")
+        for org, n in list(backlog.items())[:5]:
+            logger.info(f"  積み残し {org}: {n}件")
+
+    with stage("publish"):
+        total, kanto = count_published(db)
+        logger.info(f"1都3県: {kanto}件 / 全{total}件")
+
+        # 前回公開分から変わっていなければ何も書き換えない（コミットも起きない）
+        delta = diff_published(db)
+        published = any(delta.values())
+        logger.info(f"差分: 追加{len(delta['added'])}件・更新{len(delta['changed'])}件・削除{len(delta['dropped'])}件")
+        if published:
+            updated = datetime.now().strftime("%Y年%m月%d日 %H:%M")
+            header = {"updated": updated, "count": len(all_new_items), "total": total}
+            # ストアから1件ずつ読みながら data.json を書き、同時にファセットを数える
+            stats = new_stats()
+            write_history(HISTORY_FILE, header, tally(iter_published(db), stats))
+            with atomic_open(Path("docs/last_updated.txt")) as f:
+                f.write(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            manifest = write_shards(db, header, stats)
+            if args.compact:
+                sizes = write_compact(header, iter_published(db), stats["fields"])
+                logger.info("コンパクト形式: " + " / ".join(f"{p.name} {n // 1024}KB" for p, n in sizes.items()))
+            version = write_delta(delta, updated)
+            save_published(db)
+            logger.info(f"保存完了: {total}件（シャード{len(manifest['shards'])}件・"
+                        f"検索索引 {manifest['search']['bytes'] // 1024}KB・差分 {version}）")
+        else:
+            logger.info("公開データに変更なし（ファイルは書き換えません）")
+
+    with _stats_lock:
+        hosts = {host: {**st, "seconds": round(st["seconds"], 3)} for host, st in sorted(HTTP_STATS.items())}
+    report = {
+        "started": started_at.isoformat(timespec="seconds"),
+        "seconds": round(time.monotonic() - started, 3),
+        "published": published,
+        "complete": complete,
+        "resumed": sum(1 for st in SOURCE_STATS if st["resumed"]),
+        "counts": {
+            "scraped": len(all_new_items), "added": added, "aged": aged, "changed": changed,
+            "pruned": pruned, "stored": stored, "duplicates": duplicates, "total": total, "kanto": kanto,
+            "delta_added": len(delta["added"]), "delta_changed": len(delta["changed"]),
+            "delta_dropped": len(delta["dropped"]), "enrich_backlog": sum(backlog.values()),
+        },
+        "enrich_backlog": backlog,
+        "parse": {"seconds": round(PARSE_STATS["seconds"], 3), "pages": PARSE_STATS["pages"]},
+        "stages": STAGE_STATS,
+        "sources": SOURCE_STATS,
+        "hosts": hosts,
     }
-    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
-    with open("docs/last_updated.txt", "w") as f:
-        f.write(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    logger.info(f"保存完了: {len(combined)}件")
+    if shards is not None:
+        report["shards"] = shards
+    write_run_report(db, report)
+    db.close()
+    set_github_output(changed=str(published).lower())
+    logger.info("=== 通信統計 ===")
+    log_http_stats()
+    logger.info("=== 段階別 ===")
+    log_stage_stats()
+    prune_http_cache()
 
 if __name__ == "__main__":
     main()
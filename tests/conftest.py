@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# scripts/ はパッケージではないので、ベンチマークと同じく collect を直接 import する
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
@@ -0,0 +1,37 @@
+"""同じ告知の判定（title_fingerprint / find_duplicates）"""
+import pytest
+
+import collect
+
+LONG = "【募集開始】令和7年度 県内中小企業者の人材確保・定着支援に係る雇用環境整備奨励金の申請受付について（{}）"
+BASIC = ("令和7年度受付終了事業環境変化に対応した経営基盤強化事業（{}）コロナ後の需要回復や消費者ニーズを捉えた"
+         "経営基盤の強化に向け、各社がこれまで実施してきた事業をさらに深化・発展させる取組を支援")
+
+def collapsed(first, second, pref="東京都"):
+    entries = [("a", pref, collect.title_fingerprint(first)), ("b", pref, collect.title_fingerprint(second))]
+    return collect.find_duplicates(entries) == {"b": "a"}
+
+@pytest.mark.parametrize("first, second", [
+    (BASIC.format("一般コース"), BASIC.format("賃上げ重点コース")),
+    (LONG.format("特例コース"), LONG.format("特別枠")),
+    (LONG.format("創業型"), LONG.format("前期")),
+    (LONG.format("小規模枠"), LONG.format("後期")),
+    (LONG.format("A類型"), LONG.format("B類型")),
+])
+def test_course_variants_are_not_collapsed(first, second):
+    """区分名だけ違う長いタイトル（SimHash の差は 1〜3 ビット）は別の告知"""
+    assert not collapsed(first, second)
+
+@pytest.mark.parametrize("first, second", [
+    (BASIC.format("一般コース"), "令和７年度　受付終了 事業環境変化に対応した経営基盤強化事業 (一般コース) コロナ後の需要回復や"
+                                "消費者ニーズを捉えた経営基盤の強化に向け、各社がこれまで実施してきた事業をさらに深化・発展させる取組を支援"),
+    ("IT導入補助金（通常枠）のご案内", "IT導入補助金(通常枠)のご案内"),
+    ("中小企業デジタル化支援補助金のご案内", "中小企業デジタル化支援補助金 のご案内"),
+])
+def test_formatting_variants_are_collapsed(first, second):
+    """全角・半角や空白・括弧の違いだけなら同じ告知"""
+    assert collapsed(first, second)
+
+def test_other_prefecture_is_not_collapsed():
+    assert not collect.find_duplicates([("a", "東京都", collect.title_fingerprint(LONG.format("特例コース"))),
+                                        ("b", "埼玉県", collect.title_fingerprint(LONG.format("特例コース")))])
@@ -0,0 +1,31 @@
+"""個別取得の積み残し（enrich_backlog）"""
+from datetime import date
+
+import collect
+
+def item(n, org, title, deadline=""):
+    url = f"https://www.city.example.lg.jp/jigyo/{n}.html"
+    return {"id": collect.make_id(url), "title": title, "org": org, "pref": "東京都", "url": url,
+            "source": "自治体", "category": "その他", "deadline": deadline, "date": str(date.today())}
+
+def test_backlog_counts_store_items_still_waiting_for_enrichment(tmp_path, monkeypatch):
+    """記録がないものと期限が取れていないものを数え、再取得待ち・期限取得済み・重複・jGrants は数えない"""
+    monkeypatch.chdir(tmp_path)
+    db = collect.open_db(tmp_path / "collect.sqlite3")
+    items = [
+        item(0, "市A", "中小企業設備投資補助金の募集について"),
+        item(1, "市A", "創業支援助成金の申請受付について"),
+        item(2, "市B", "省エネルギー設備導入費補助金のご案内"),
+        item(3, "市B", "商店街にぎわい創出事業補助金について"),
+        item(4, "市B", "商店街にぎわい創出事業補助金について"),
+        item(5, "市B", "販路開拓支援事業補助金の募集について", deadline="令和9年1月31日締切"),
+        dict(item(6, "市B", "ものづくり補助金の公募について"), url="https://www.jgrants-portal.go.jp/subsidy/1"),
+    ]
+    collect.store_items(db, items)
+    store = {}
+    collect.record_enrichment(store, items[1], "", None)
+    collect.record_enrichment(store, items[2], "令和9年3月31日締切", None)
+    collect.save_enrich_store(db, store)
+    collect.mark_duplicates(db)
+
+    assert collect.enrich_backlog(db) == {"市A": 1, "市B": 1}
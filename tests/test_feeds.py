@@ -0,0 +1,36 @@
+"""RSS / Atom フィードの読み込み（parse_feed_body）"""
+import pytest
+
+import collect
+
+FEED_URL = "https://www.example.go.jp/rss/news.xml"
+
+def rss(*titles):
+    entries = "".join(f"<item><title>{title}</title><link>https://www.example.go.jp/news/{i}.html</link></item>"
+                      for i, title in enumerate(titles))
+    return f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>{entries}</channel></rss>'.encode()
+
+@pytest.mark.parametrize("title", [
+    "病院の面会制限について",
+    "奨学金の案内と支援事業",
+    "後期高齢者医療制度の保険料について",
+    "庁舎清掃業務の競争入札（入札公告）",
+    "職員採用試験（令和8年度）の公募について",
+])
+def test_feed_rejects_non_subsidy_titles(title):
+    """省庁の報道発表フィードに流れてくる補助金以外の告知はアイテムにしない"""
+    assert not collect.is_feed_subsidy(title)
+    assert collect.parse_feed_body(rss(title), FEED_URL, "全国", "厚生労働省") == []
+
+def test_feed_keeps_subsidy_titles():
+    items = collect.parse_feed_body(rss("病院の面会制限について", "医療機関等物価高騰対策支援金の申請受付について",
+                                        "奨学金の案内と支援事業", "令和8年度 IT導入補助金の公募開始"),
+                                    FEED_URL, "全国", "厚生労働省")
+    assert [item["title"] for item in items] == ["医療機関等物価高騰対策支援金の申請受付について",
+                                                 "令和8年度 IT導入補助金の公募開始"]
+    assert {item["source"] for item in items} == {"国・省庁"}
+
+def test_feed_stops_at_max_entries():
+    titles = [f"中小企業設備投資補助金 第{i}回" for i in range(collect.FEED_MAX_ENTRIES + 20)]
+    items = collect.parse_feed_body(rss(*titles), FEED_URL, "全国", "経済産業省")
+    assert len(items) == collect.FEED_MAX_ENTRIES
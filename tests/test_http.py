@@ -0,0 +1,23 @@
+"""ホストごとの接続プールの登録（_host_slot・_mount）"""
+import requests
+
+import collect
+
+def test_mount_replaces_adapters_instead_of_changing_them():
+    """取得中のスレッドが回している adapters は、後から初めて出てきたホストを登録しても変わらない"""
+    session = requests.Session()
+    adapters = session.adapters
+    before = list(adapters)
+    collect._host_slot("www.late-host.example.lg.jp", "https", session)
+    assert list(adapters) == before
+    assert session.adapters is not adapters
+    assert "https://www.late-host.example.lg.jp/" in session.adapters
+
+def test_mount_keeps_the_same_order_as_session_mount():
+    """長い接頭辞ほど先に並ぶ（get_adapter は先頭から一致を探す）"""
+    ours, theirs = requests.Session(), requests.Session()
+    for prefix in ("https://www.example.lg.jp/", "http://www.example.lg.jp/", "https://a.example.lg.jp/"):
+        adapter = requests.adapters.HTTPAdapter()
+        collect._mount(ours, prefix, adapter)
+        theirs.mount(prefix, adapter)
+    assert list(ours.adapters) == list(theirs.adapters)
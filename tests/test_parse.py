@@ -0,0 +1,47 @@
+"""HTML 解析（lxml 版と BeautifulSoup 版の一致）"""
+import pytest
+import requests
+
+import collect
+
+PAGE_URL = "https://www.pref.example.lg.jp/docs/index.html"
+
+def nested(depth, inner):
+    return "<div>" * depth + inner + "</div>" * depth
+
+def both_backends(monkeypatch, func, *args):
+    results = {}
+    for backend in ("bs4", "lxml"):
+        monkeypatch.setattr(collect, "PARSER_BACKEND", backend)
+        results[backend] = func(*args)
+    return results
+
+@pytest.mark.parametrize("depth", [300, 1500, 3000])
+def test_deep_nesting_page_info(monkeypatch, depth):
+    """libxml2 の既定の深さ制限（256段）・再帰の上限・LXML_MAX_DEPTH を超える入れ子でも bs4 と同じ結果になる"""
+    html = ("<html><body><main>" + nested(depth, "<p>申請期間：令和8年4月1日から令和8年5月10日まで</p>")
+            + "<p>掲載日 令和7年3月3日</p></main></body></html>")
+    results = both_backends(monkeypatch, collect.parse_page_info, html)
+    assert results["lxml"] == results["bs4"]
+    assert results["lxml"][0] == "令和8年4月1日締切"
+
+@pytest.mark.parametrize("depth", [300, 1500, 3000])
+def test_deep_nesting_listing(monkeypatch, depth):
+    html = ("<html><body><ul>" + nested(depth, '<li><a href="/docs/1.html">中小企業設備投資補助金のご案内</a>'
+                                             "<span>締切：令和8年2月10日</span></li>")
+            + '<li><a href="/docs/2.html">令和8年度 創業支援助成金の募集について</a></li><a href="?page=2">次へ</a></ul></body></html>')
+    results = both_backends(monkeypatch, collect.parse_listing, html, PAGE_URL, "東京都", "東京都")
+    assert results["lxml"] == results["bs4"]
+    items, has_next = results["lxml"]
+    assert [item["url"] for item in items] == ["https://www.pref.example.lg.jp/docs/1.html",
+                                              "https://www.pref.example.lg.jp/docs/2.html"]
+    assert items[0]["deadline"] and has_next
+
+@pytest.mark.parametrize("encoding", ["shift_jis", "euc_jp", "utf-8"])
+def test_decode_body_detects_encoding_like_requests(encoding):
+    """文字コードを渡さないときは res.apparent_encoding と同じ推定で読む（推定は解析側で行う）"""
+    html = "<html><body><p>中小企業設備投資補助金の募集について。申請期間：令和8年4月1日から令和8年5月10日まで</p></body></html>"
+    res = requests.Response()
+    res._content = html.encode(encoding)
+    res.encoding = res.apparent_encoding
+    assert collect.decode_body(res.content, None) == res.text
@@ -0,0 +1,32 @@
+"""都道府県別シャードと検索索引の書き出し（write_shards）"""
+from datetime import date
+
+import collect
+
+def item(n, pref):
+    url = f"https://www.city.example.lg.jp/jigyo/{n}.html"
+    return {"id": collect.make_id(url), "title": f"中小企業設備投資補助金 第{n}回募集について", "org": "市",
+            "pref": pref, "url": url, "source": "自治体", "category": "設備・機械", "deadline": "",
+            "date": str(date.today())}
+
+def publish(db, *items):
+    collect.store_items(db, list(items))
+    collect.mark_duplicates(db)
+    return collect.write_shards(db, {"updated": "", "count": 0, "total": 0}, collect.new_stats())
+
+def files(manifest):
+    return {entry["file"] for entry in manifest["shards"]} | {manifest["search"]["file"]}
+
+def test_previous_generation_stays_until_the_next_publish(tmp_path, monkeypatch):
+    """前の manifest が指すシャードと検索索引は残し、2つ前のものだけ消す"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(collect, "SHARD_DIR", tmp_path / "data")
+    db = collect.open_db(tmp_path / "collect.sqlite3")
+    first = publish(db, item(1, "東京都"), item(2, "大阪府"))
+    second = publish(db, item(3, "東京都"))
+    third = publish(db, item(4, "東京都"))
+
+    on_disk = {f"data/{path.name}" for path in (tmp_path / "data").iterdir() if path.name != "manifest.json"}
+    assert files(second) | files(third) == on_disk
+    assert files(first) - files(second) - files(third)
+    assert not on_disk & (files(first) - files(second) - files(third))
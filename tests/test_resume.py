@@ -0,0 +1,100 @@
+"""--time-budget で中断した実行と、チェックポイントから再開した実行（run）"""
+import gzip
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import collect
+
+SCRIPTS = Path(collect.__file__).resolve().parent
+
+# 取得元ごとに一覧1ページと、期限が切れたもの・先のもの・載っていないものの個別ページ。
+# 取得元をまたいで同じタイトルも置く（どちらを残すかは seq の順で決まる）
+SOURCES = [{"url": f"https://www.city{n}.example.lg.jp/jigyo/hojo.html", "pref": "東京都", "org": f"市{n}"}
+           for n in range(4)]
+TITLES = ["中小企業設備投資補助金の募集について", "創業支援助成金（第2期）の申請受付",
+          "省エネルギー設備導入費補助金のご案内", "商店街にぎわい創出事業補助金について"]
+
+# cut のときは定義順で先頭でない 市2 だけが一覧を取得し終え、ほかの取得元と個別取得は時間切れで次回に回る
+DRIVER = """
+import sys
+sys.path.insert(0, sys.argv[1])
+import collect
+collect.SOURCES = {sources!r}
+collect.DEFAULT_HOST_POLICY["delay"] = 0
+if sys.argv[2] == "cut":
+    def out_of_time():
+        stats = getattr(collect._source_local, "stats", None)
+        return stats is not None and stats["org"] != "市2"
+    collect.out_of_time = out_of_time
+    collect._deadline = 0
+collect.main(["--replay", sys.argv[3]] + sys.argv[4:])
+"""
+
+def record(directory, url, body):
+    meta_path, body_path = collect._recording_paths(directory, url)
+    meta_path.write_text(json.dumps({"url": url, "status": 200, "reason": "OK",
+                                     "headers": {"Content-Type": "text/html; charset=utf-8"}}))
+    body_path.write_bytes(gzip.compress(body.encode("utf-8")))
+
+def write_site(directory):
+    directory.mkdir()
+    for n, source in enumerate(SOURCES):
+        base = source["url"].rsplit("/", 1)[0]
+        links = []
+        for i in range(3):
+            title = TITLES[(n + i) % len(TITLES)] if i < 2 else f"{TITLES[i]}（市{n}）"
+            links.append(f'<li><a href="{base}/{i}.html">{title}</a></li>')
+            dates = [f"掲載日：令和6年4月{1 + n}日", f"申請期限：令和9年1月{10 + n}日", ""][i]
+            record(directory, f"{base}/{i}.html", f"<html><body><main><h1>{title}</h1><p>{dates}</p></main></body></html>")
+        record(directory, source["url"], f"<html><body><main><ul>{''.join(links)}</ul></main></body></html>")
+
+def collect_run(work, replay, mode="full", *args):
+    work.mkdir(exist_ok=True)
+    result = subprocess.run([sys.executable, "-c", DRIVER.format(sources=SOURCES), str(SCRIPTS), mode, str(replay),
+                             *args], cwd=work, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stderr
+
+def published(work):
+    return json.loads((work / "docs" / "data.json").read_text(encoding="utf-8"))["items"]
+
+def test_cut_and_resume_matches_single_run(tmp_path):
+    """時間切れで中断して再開した結果は、1回で取得し終えた場合と同じになる"""
+    replay = tmp_path / "replay"
+    write_site(replay)
+    single, resumed = tmp_path / "single", tmp_path / "resumed"
+    collect_run(single, replay)
+
+    log = collect_run(resumed, replay, "cut")
+    assert "未完了の取得元 3件" in log
+    assert {item["org"] for item in published(resumed)} == {"市2"}
+    log = collect_run(resumed, replay)
+    assert "チェックポイントから再開: 1件" in log
+
+    items = published(single)
+    assert published(resumed) == items
+    assert {item["org"] for item in items} == {"市0", "市1", "市2", "市3"}
+    assert {item["status"] for item in items} == {"active", "expired"}
+
+def test_reduce_without_a_partial_keeps_items_for_the_next_reduce(tmp_path):
+    """部分結果が欠けた --reduce が追加したアイテムは、次の --reduce で取り消さない（チェックポイントがないので戻らない）"""
+    replay = tmp_path / "replay"
+    write_site(replay)
+    work, partials = tmp_path / "reduce", tmp_path / "reduce" / "partials"
+    shards = {i: {source["org"] for source in SOURCES if collect.shard_of(source, 2) == i} for i in (1, 2)}
+    assert shards[1] and shards[2]
+    for i in (1, 2):
+        collect_run(work, replay, "full", "--shard", f"{i}/2")
+    saved = {path.name: path.read_bytes() for path in partials.iterdir()}
+
+    (partials / "shard-2-of-2.json").unlink()
+    log = collect_run(work, replay, "full", "--reduce")
+    assert "部分結果なし" in log
+    assert {item["org"] for item in published(work)} == shards[1]
+
+    (partials / "shard-1-of-2.json").unlink()
+    (partials / "shard-2-of-2.json").write_bytes(saved["shard-2-of-2.json"])
+    collect_run(work, replay, "full", "--reduce")
+    assert {item["org"] for item in published(work)} == shards[1] | shards[2]